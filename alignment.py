@@ -0,0 +1,147 @@
+from bisect import bisect_left
+from collections import namedtuple
+
+from metrics import timed
+from planner import Cut
+
+Word = namedtuple("Word", ["start", "end", "text"])  # start/end in milliseconds
+SNAP_DISTANCE = 300  # furthest a cut point moves to a word boundary, in milliseconds
+
+
+def transcribe_words(model, audio, language=None, prompt=None, offset=0):
+    """
+    Transcribe a source file, or a long region of one, with word-level timestamps.
+
+    Whisper works through the audio in consecutive 30 s windows, each
+    conditioned on the text before it, so no window is padding and words at
+    slice boundaries keep their context.
+
+    Parameters:
+        model: Loaded Whisper model.
+        audio: Path to the file, or its 16 kHz mono float32 samples.
+        language (str): Spoken language, or None to detect it.
+        prompt (str): Text spoken before the audio, e.g. the previous
+            region's, to condition the first window on.
+        offset (int): Position of the audio in the file, in milliseconds,
+            added to the word times.
+
+    Returns:
+        list: Word tuples in time order.
+    """
+    with timed("inference", 0.0 if isinstance(audio, str) else len(audio) / 16000):  # 16 kHz samples
+        result = model.transcribe(audio, language=language, word_timestamps=True, initial_prompt=prompt)
+    return [
+        Word(offset + int(round(word["start"] * 1000)), offset + int(round(word["end"] * 1000)), word["word"])
+        for segment in result["segments"]
+        for word in segment.get("words", [])
+    ]
+
+
+def _cut_times(cut, frame_rate):
+    """Return the (start, end) of a cut's audio in milliseconds."""
+    return 1000 * cut.start_frame / frame_rate, 1000 * cut.end_frame / frame_rate
+
+
+def assign_words(words, cuts, frame_rate):
+    """
+    Give every word to the slice that holds most of it.
+
+    Parameters:
+        words (list): Word tuples in time order.
+        cuts (list): Cut tuples in file order.
+        frame_rate (int): Sample rate of the source.
+
+    Returns:
+        dict: Cut index -> text of the words inside that slice. Words that
+        fall between slices are dropped, as their audio is in no slice.
+    """
+    times = [_cut_times(cut, frame_rate) for cut in cuts]
+    texts = {cut.index: [] for cut in cuts}
+    first = 0
+    for word in words:
+        # Zero-length words still belong somewhere
+        word_end = max(word.end, word.start + 1)
+        while first < len(cuts) and times[first][1] <= word.start:
+            first += 1
+        best, best_overlap = None, 0
+        for cut, (start, end) in zip(cuts[first:], times[first:]):
+            if start >= word_end:
+                break
+            overlap = min(end, word_end) - max(start, word.start)
+            if overlap > best_overlap:
+                best, best_overlap = cut, overlap
+        if best is not None:
+            texts[best.index].append(word.text)
+    return {index: "".join(parts).strip() for index, parts in texts.items()}
+
+
+def _edges(point, words, starts, max_shift):
+    """Return the edges of the word a point falls inside that are within max_shift, nearer edge first."""
+    i = bisect_left(starts, point) - 1
+    if i < 0 or point >= words[i].end:
+        return []
+    word = words[i]
+    edges = sorted((word.start, word.end), key=lambda edge: abs(edge - point))
+    return [edge for edge in edges if edge != point and abs(edge - point) <= max_shift]
+
+
+def _within(length, planned, min_length, max_length):
+    """Whether a moved slice length stays in [min_length, max_length], or no further out than planned."""
+    return min(planned, min_length) <= length <= max(planned, max_length)
+
+
+def snap_cuts(cuts, words, envelope, min_length, max_length, max_shift=SNAP_DISTANCE):
+    """
+    Move cut points that fall inside a word to the nearest word boundary.
+
+    A point moves to the nearer edge of its word, or to the other edge when
+    the nearer one is out of reach, but only if every slice the point bounds
+    stays within [min_length, max_length] (or, for a slice the planner had
+    to make shorter or longer, gets no further out of bounds) and no two
+    slices overlap. A point shared by two adjacent slices moves for both.
+
+    Parameters:
+        cuts (list): Cut tuples in file order.
+        words (list): Word tuples in time order.
+        envelope (SilenceEnvelope): Envelope of the source, to convert
+            milliseconds to frames the way the planners do.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        max_shift (int): Largest move of a cut point, in milliseconds.
+
+    Returns:
+        list: The adjusted Cut tuples, with the planned indices.
+    """
+    starts = [word.start for word in words]
+    snapped = []
+    for i, cut in enumerate(cuts):
+        previous = cuts[i - 1] if i else None
+        following = cuts[i + 1] if i + 1 < len(cuts) else None
+        if previous is not None and previous.end == cut.start:
+            start = snapped[-1].end  # moved (or not) with the previous slice's end
+        else:
+            earliest = snapped[-1].end if snapped else 0
+            start = next((edge for edge in _edges(cut.start, words, starts, max_shift)
+                          if edge >= earliest and _within(cut.end - edge, cut.end - cut.start, min_length, max_length)),
+                         cut.start)
+
+        shared = following is not None and following.start == cut.end
+        end = cut.end
+        for edge in _edges(cut.end, words, starts, max_shift):
+            if edge <= start or (shared and edge >= following.end):
+                continue
+            if not shared and edge > (following.start if following is not None else len(envelope)):
+                continue
+            if not _within(edge - start, cut.end - cut.start, min_length, max_length):
+                continue
+            if shared and not _within(following.end - edge, following.end - following.start, min_length, max_length):
+                continue
+            end = edge
+            break
+
+        if start == cut.start and end == cut.end:
+            snapped.append(cut)
+            continue
+        start, end, first_frame, frames = envelope.span(start, end)
+        snapped.append(Cut(cut.index, start, end, first_frame, first_frame + frames))
+    return snapped
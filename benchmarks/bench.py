@@ -0,0 +1,204 @@
+"""
+Benchmark slicing and transcription throughput on synthetic speech-like audio.
+
+    python benchmarks/bench.py --json results.json
+    python benchmarks/bench.py --lengths 60,600,3600 --settings 3-11,2-20 --workers 1,4
+    python benchmarks/bench.py --compare results.json        # after a change
+
+Every case runs in a fresh process, so its peak RSS is its own (including
+any pool workers it starts). Slicing cases report wall time, slices per
+second, the real-time factor over the input audio and the per-stage timings
+of metrics.py. Transcription cases run the Process & Transcribe pipeline
+with a stub in place of Whisper (--model stub, the default), which measures
+everything but the model, or with a real model such as --model tiny.
+
+The audio is generated once into --data and reused, so results from one
+machine are comparable across commits.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, REPO)
+sys.path.insert(0, BENCHMARKS)
+
+from synthetic import write_dataset  # noqa: E402
+
+# Fields that identify a case, for --compare
+CASE_KEYS = ("kind", "seconds", "files", "min_length", "max_length", "planner", "workers", "streaming", "model")
+
+
+def peak_rss_mb():
+    """Return the peak RSS of this process and its finished children, in MB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def stub_transcribe_batch(rtf):
+    """Return a transcribe_batch stand-in that takes rtf seconds per second of audio."""
+    def transcribe_batch(model, audio, batch_size=16, language=None):
+        if rtf:
+            time.sleep(rtf * sum(len(clip) for clip in audio) / 16000)
+        return ["" for _ in audio]
+    return transcribe_batch
+
+
+def dataset_folder(case):
+    return os.path.join(case["data"], f"{case['files']}x{case['seconds']}s")
+
+
+def run_case(case):
+    """Run one case in this process and return its measurements."""
+    from metrics import REGISTRY
+
+    input_folder = dataset_folder(case)
+    output_folder = tempfile.mkdtemp(prefix="audioslicer-bench-")
+    try:
+        started = time.perf_counter()
+        if case["kind"] == "slice":
+            from slicer import slice_audio
+
+            slices = sum(1 for _ in slice_audio(input_folder, output_folder, case["min_length"], case["max_length"],
+                                                case["planner"], case["streaming"], case["workers"],
+                                                case["region_length"]))
+        else:
+            import pipeline
+
+            if case["model"] == "stub":
+                pipeline.transcribe_batch = stub_transcribe_batch(case["stub_rtf"])
+                model = None
+            else:
+                from models import ModelRegistry
+
+                model = ModelRegistry(max_models=1).get(case["model"])
+            slices = sum(1 for _ in pipeline.slice_and_transcribe(input_folder, output_folder, case["min_length"],
+                                                                  case["max_length"], model, planner=case["planner"],
+                                                                  streaming=case["streaming"]))
+        seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    audio_seconds = case["files"] * case["seconds"]
+    result = {key: case[key] for key in CASE_KEYS}
+    result.update({
+        "wall_seconds": round(seconds, 3),
+        "slices": slices,
+        "slices_per_second": round(slices / seconds, 2),
+        "real_time_factor": round(seconds / audio_seconds, 5),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": REGISTRY.summary(),
+    })
+    return result
+
+
+def run_in_subprocess(case):
+    output = subprocess.run([sys.executable, __file__, "--case", json.dumps(case)], check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def build_cases(args):
+    settings = [tuple(int(value) * 1000 for value in pair.split("-")) for pair in args.settings.split(",")]
+    common = {"data": args.data, "files": args.files, "region_length": args.region_length * 1000,
+              "stub_rtf": args.stub_rtf}
+    cases = []
+    for seconds, (min_length, max_length), planner, workers, streaming in itertools.product(
+            [int(length) for length in args.lengths.split(",")], settings, args.planners.split(","),
+            [int(count) for count in args.workers.split(",")], [False, True] if args.streaming else [False]):
+        case = dict(common, kind="slice", seconds=seconds, min_length=min_length, max_length=max_length,
+                    planner=planner, workers=workers, streaming=streaming, model=None)
+        cases.append(case)
+        if args.transcribe and workers == 1:
+            cases.append(dict(case, kind="transcribe", model=args.model))
+    return cases
+
+
+def case_key(result):
+    return tuple(result.get(key) for key in CASE_KEYS)
+
+
+def compare(results, baseline_path):
+    """Print the wall time and peak RSS of each case against a baseline run."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {case_key(result): result for result in json.load(file)["results"]}
+    print(f"\n{'case':<48} {'time':>8} {'baseline':>9} {'change':>8} {'RSS change':>11}")
+    for result in results:
+        before = baseline.get(case_key(result))
+        if before is None:
+            continue
+        change = result["wall_seconds"] / before["wall_seconds"] - 1
+        rss_change = result["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        print(f"{describe(result):<48} {result['wall_seconds']:>8.2f} {before['wall_seconds']:>9.2f} "
+              f"{change:>+8.1%} {rss_change:>+11.1%}")
+
+
+def describe(result):
+    streaming = " stream" if result["streaming"] else ""
+    model = f" {result['model']}" if result["kind"] == "transcribe" else ""
+    return (f"{result['kind']}{model} {result['files']}x{result['seconds']}s "
+            f"{result['min_length'] // 1000}-{result['max_length'] // 1000}s {result['planner']} "
+            f"w{result['workers']}{streaming}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lengths", default="60,600", help="comma-separated file lengths in seconds")
+    parser.add_argument("--files", type=int, default=2, help="files per case (default: 2)")
+    parser.add_argument("--settings", default="3-11,2-20", help="comma-separated min-max slice lengths in seconds")
+    parser.add_argument("--planners", default="greedy", help="comma-separated planners (default: greedy)")
+    parser.add_argument("--workers", default="1", help="comma-separated slicing process counts (default: 1)")
+    parser.add_argument("--region-length", type=int, default=600, help="region length for workers > 1, in seconds")
+    parser.add_argument("--streaming", action="store_true", help="also run every slicing case in streaming mode")
+    parser.add_argument("--no-transcribe", dest="transcribe", action="store_false",
+                        help="skip the transcription cases")
+    parser.add_argument("--model", default="stub", help="Whisper model for transcription cases, or 'stub'")
+    parser.add_argument("--stub-rtf", type=float, default=0.0,
+                        help="seconds the stub model takes per second of audio (default: 0, pipeline overhead only)")
+    parser.add_argument("--data", default=os.path.join(tempfile.gettempdir(), "audioslicer-bench-data"),
+                        help="folder the generated audio is kept in")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare against the results file of an earlier run")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    results = []
+    print(f"{'case':<48} {'seconds':>8} {'slices':>7} {'slices/s':>9} {'RTF':>8} {'RSS MB':>8}")
+    for case in build_cases(args):
+        # Generated here, so the generator's memory is not part of the case's peak RSS
+        write_dataset(dataset_folder(case), case["files"], case["seconds"])
+        result = run_in_subprocess(case)
+        results.append(result)
+        print(f"{describe(result):<48} {result['wall_seconds']:>8.2f} {result['slices']:>7} "
+              f"{result['slices_per_second']:>9.1f} {result['real_time_factor']:>8.4f} {result['peak_rss_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "results": results,
+            }, file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
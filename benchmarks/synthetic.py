@@ -0,0 +1,88 @@
+"""
+Deterministic, speech-like test audio for the benchmarks.
+
+A file is a sequence of "utterances" separated by pauses. An utterance is a
+run of syllables: harmonic tones with a wandering pitch, a short attack and
+decay, and a little breath noise. Pauses hold a low noise floor, not digital
+silence, so the silence detector works as it does on recordings. The same
+seed always gives the same samples.
+"""
+import os
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 44100
+NOISE_FLOOR = 0.002  # amplitude of the background noise, about -54 dBFS
+CHUNK_SECONDS = 60  # long files are generated and written a chunk at a time
+
+
+def _syllable(rng, seconds, rate):
+    frames = int(seconds * rate)
+    t = np.arange(frames) / rate
+    pitch = rng.uniform(90, 250) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    tone = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.minimum(1, np.minimum(t / 0.02, (seconds - t) / 0.05))
+    noise = rng.standard_normal(frames, dtype=np.float32) * 0.01
+    return (tone * envelope * rng.uniform(0.15, 0.4)).astype(np.float32) + noise
+
+
+def speech_like(seconds, rate=SAMPLE_RATE, seed=0, pause_range=(0.15, 1.5), utterance_range=(0.5, 6.0)):
+    """
+    Generate mono speech-like audio.
+
+    Parameters:
+        seconds (float): Length of the audio.
+        rate (int): Sample rate.
+        seed (int): Random seed; the same seed gives the same audio.
+        pause_range (tuple): Shortest and longest pause between utterances, in seconds.
+        utterance_range (tuple): Shortest and longest utterance, in seconds.
+
+    Returns:
+        numpy.ndarray: float32 samples in [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    audio = rng.standard_normal(total, dtype=np.float32) * NOISE_FLOOR
+    position = int(rng.uniform(*pause_range) * rate)
+    while position < total:
+        end = min(total, position + int(rng.uniform(*utterance_range) * rate))
+        while position < end:
+            syllable = _syllable(rng, rng.uniform(0.08, 0.35), rate)[:end - position]
+            audio[position:position + len(syllable)] += syllable
+            # Syllables within an utterance are separated by short gaps
+            position += len(syllable) + int(rng.uniform(0.0, 0.08) * rate)
+        position += int(rng.uniform(*pause_range) * rate)
+    return np.clip(audio, -1, 1)
+
+
+def write_dataset(folder, count, seconds, rate=SAMPLE_RATE, seed=0, subtype="PCM_16"):
+    """
+    Write count speech-like WAV files, skipping files that already exist.
+
+    Files are generated in CHUNK_SECONDS pieces (each starting with a pause),
+    so hour-long files do not need their samples in memory at once.
+
+    Parameters:
+        folder (str): Folder to write to.
+        count (int): Number of files.
+        seconds (float): Length of each file.
+        rate (int): Sample rate.
+        seed (int): Seed of the first file; file i uses seed + i.
+        subtype (str): soundfile subtype, e.g. "PCM_16" or "PCM_24".
+
+    Returns:
+        list: Paths of the files.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic_{seed + i}_{int(seconds)}s.wav")
+        if not os.path.exists(path):
+            with sf.SoundFile(path + ".tmp", "w", rate, 1, subtype, format="WAV") as file:
+                for chunk, start in enumerate(np.arange(0, seconds, CHUNK_SECONDS)):
+                    file.write(speech_like(min(CHUNK_SECONDS, seconds - start), rate, [seed + i, chunk]))
+            os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,298 @@
+"""
+Slice and transcribe audio folders from the command line, without the web server.
+
+    python cli.py slice recordings/ dataset/sliced --min 3 --max 11 --workers 4
+    python cli.py transcribe dataset/sliced --model small --dtype int8
+    python cli.py run recordings/ dataset/sliced --mode source
+    python cli.py watch recordings/ dataset/ --transcribe --interval 60
+
+transcriptions.csv is written next to the slices, as the web UI does, and
+runs are incremental in the same way: a folder sliced or transcribed from the
+UI can be continued here and the other way round. torch and Whisper are only
+imported once a command actually transcribes, so `slice` starts in well under
+a second.
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+from encoder import DEFAULT_OUTPUT, OutputFormat
+from ingest import SCAN_INTERVAL, WatchFolder
+from manifest import Manifest
+from metrics import REGISTRY, profiled
+from models import DTYPES, ModelRegistry
+from pipeline import list_slices, slice_and_transcribe, slice_and_transcribe_sources, transcribe_slices
+from planner import PLANNERS
+from preprocess import CACHE_FOLDER, PREPROCESSORS, preprocess_folder, remove_view
+from shards import SHARD_FORMAT
+from slicer import slice_audio
+from transcribe import TranscriptionWriter, format_row
+
+HEADER_ROW = "audio_file|text|speaker_name"
+METADATA_FORMAT = "{audio_file}|{text}|{speaker_name}"
+SPEAKER_NAME = "coqui"
+
+
+def log(args, message):
+    if not args.quiet:
+        print(message, flush=True)
+
+
+def slice_output(args):
+    return OutputFormat(args.format, args.sample_rate, args.bit_depth)
+
+
+def open_manifest(args, output_folder, sharded):
+    """Return the manifest of output_folder, or None for --no-incremental and shard output."""
+    return None if args.no_incremental or sharded else Manifest(output_folder)
+
+
+def model_key(args):
+    """Identify the model in the manifest; matches the web UI, so both share cached transcripts."""
+    return f"{args.model}:{args.dtype or 'float32'}"
+
+
+def row_key(args, file_path, key):
+    """A row only counts as done for the same file, model and row format."""
+    return f"{file_path}|{key}|{args.speaker}|{args.metadata_format}"
+
+
+def model_loader(args):
+    """Return a function loading the requested model on first call."""
+    registry = ModelRegistry(max_models=1, intra_op_threads=args.threads, inter_op_threads=args.interop_threads)
+
+    def load():
+        log(args, f"Loading Whisper {args.model}...")
+        return registry.get(args.model, args.device, args.dtype)
+
+    return load
+
+
+@contextmanager
+def preprocessed(args, file_paths=None):
+    """Give the folder to slice and the files to slice in it: the input's, or their cleaned copies with --preprocess."""
+    if not args.preprocess:
+        yield args.input, file_paths
+        return
+
+    def on_progress(file_path, done, total):
+        log(args, f"Preprocessing {os.path.basename(file_path)} ({args.preprocess}, chunk {done}/{total})")
+
+    view_folder, view_paths = preprocess_folder(args.input, args.preprocess_cache, args.preprocess,
+                                                args.preprocess_workers, file_paths, on_progress)
+    try:
+        yield view_folder, view_paths
+    finally:
+        remove_view(view_folder)
+
+
+def slice_command(args, file_paths=None):
+    started = time.perf_counter()
+    with preprocessed(args, file_paths) as (input_folder, file_paths):
+        manifest = open_manifest(args, args.output, args.format == SHARD_FORMAT)
+        sliced_files = slice_audio(input_folder, args.output, args.min * 1000, args.max * 1000, args.planner,
+                                   args.streaming, args.workers, args.region_length * 1000, manifest,
+                                   slice_output(args), file_paths)
+        count = 0
+        for count, file_name in enumerate(sliced_files, 1):
+            log(args, f"[{count}] {file_name}")
+        log(args, f"{count} slices in {time.perf_counter() - started:.1f} s")
+        return 0
+
+
+def transcribe_command(args):
+    audio_files, shard_reader = list_slices(args.output)
+    if not audio_files:
+        print(f"No slices found in {args.output}", file=sys.stderr)
+        return 1
+    manifest = open_manifest(args, args.output, shard_reader is not None)
+    key = model_key(args)
+    started = time.perf_counter()
+    with TranscriptionWriter(args.output, args.header) as writer:
+        done = writer.resume([row_key(args, file_path, key) for file_path in audio_files])
+        if done:
+            log(args, f"Resuming after {done} rows")
+        rows = transcribe_slices(audio_files[done:], model_loader(args), args.batch_size, args.language,
+                                 shard_reader, manifest, key)
+        for idx, (file_path, text) in enumerate(rows, done + 1):
+            log(args, f"[{idx}/{len(audio_files)}] {os.path.basename(file_path)}: {text.strip()}")
+            writer.write(format_row(args.metadata_format, file_path, text, args.speaker), row_key(args, file_path, key))
+        if manifest is not None:
+            manifest.save()
+    log(args, f"{len(audio_files)} rows in {time.perf_counter() - started:.1f} s -> {writer.path}")
+    return 0
+
+
+def run_command(args, file_paths=None, load_model=None):
+    started = time.perf_counter()
+    with preprocessed(args, file_paths) as (input_folder, file_paths):
+        model = (load_model or model_loader(args))()
+        key = model_key(args)
+        manifest = open_manifest(args, args.output, args.format == SHARD_FORMAT)
+        if args.mode == "source":
+            key = f"{key}:source"
+            slices = slice_and_transcribe_sources(input_folder, args.output, args.min * 1000, args.max * 1000, model,
+                                                  args.planner, args.streaming, args.language, snap=args.snap,
+                                                  manifest=manifest, model_key=key, output=slice_output(args),
+                                                  file_paths=file_paths)
+        else:
+            slices = slice_and_transcribe(input_folder, args.output, args.min * 1000, args.max * 1000, model,
+                                          args.batch_size, args.planner, args.streaming, args.language,
+                                          queue_size=args.queue_size, manifest=manifest, model_key=key,
+                                          output=slice_output(args), file_paths=file_paths)
+        # Opened with the first row: the output folder is prepared once slicing starts
+        writer = None
+        try:
+            for idx, (file_path, text) in enumerate(slices, 1):
+                log(args, f"[{idx}] {os.path.basename(file_path)}: {text.strip()}")
+                if writer is None:
+                    writer = TranscriptionWriter(args.output, args.header)
+                writer.write(format_row(args.metadata_format, file_path, text, args.speaker),
+                             row_key(args, file_path, key))
+        except BaseException:
+            slices.close()
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is None:
+            print(f"No audio files found in {args.input}", file=sys.stderr)
+            return 1
+        writer.close()
+        log(args, f"{writer.rows} rows in {time.perf_counter() - started:.1f} s -> {writer.path}")
+        return 0
+
+
+def watch_command(args):
+    if args.no_incremental or args.format == SHARD_FORMAT:
+        print("watch keeps every output folder incremental: drop --no-incremental and shard output", file=sys.stderr)
+        return 2
+    watch = WatchFolder(args.input, args.output)
+    # Loaded once, with the first folder that has something to transcribe
+    load_model = functools.lru_cache(maxsize=None)(model_loader(args))
+    for scan in watch.poll(args.interval, args.once):
+        if scan.waiting:
+            log(args, f"{scan.waiting} files still being written")
+        for folder in scan.folders:
+            log(args, f"{folder.input_folder}: {len(folder.ready)} new or changed, {len(folder.removed)} removed")
+            folder_args = argparse.Namespace(**dict(vars(args), input=folder.input_folder, output=folder.output_folder))
+            try:
+                if args.transcribe:
+                    run_command(folder_args, folder.file_paths, load_model)
+                else:
+                    slice_command(folder_args, folder.file_paths)
+            except Exception as error:
+                # Not committed, so the folder is handled again after the next scan
+                print(f"{folder.input_folder}: {error}", file=sys.stderr)
+                continue
+            watch.commit(folder)
+    return 0
+
+
+def print_timings(summary):
+    print(f"{'stage':<17} {'calls':>7} {'seconds':>9} {'audio s':>9} {'RTF':>8}")
+    for stage, totals in summary.items():
+        rtf = "-" if totals["real_time_factor"] is None else f"{totals['real_time_factor']:.4f}"
+        print(f"{stage:<17} {totals['calls']:>7} {totals['seconds']:>9.3f} {totals['audio_seconds']:>9.1f} {rtf:>8}")
+
+
+def add_slice_options(parser):
+    parser.add_argument("--min", type=int, default=3, help="minimum slice length in seconds (default: 3)")
+    parser.add_argument("--max", type=int, default=11, help="maximum slice length in seconds (default: 11)")
+    parser.add_argument("--planner", choices=sorted(PLANNERS), default="greedy")
+    parser.add_argument("--streaming", action="store_true", help="decode block by block to bound memory")
+    parser.add_argument("--format", choices=["wav", "flac", SHARD_FORMAT], default=DEFAULT_OUTPUT.format)
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_OUTPUT.sample_rate)
+    parser.add_argument("--bit-depth", type=int, default=DEFAULT_OUTPUT.bit_depth)
+    parser.add_argument("--preprocess", choices=PREPROCESSORS, default=None,
+                        help="denoise the inputs, or keep only their vocals, before slicing (cached)")
+    parser.add_argument("--preprocess-workers", type=int, default=1, help="processes cleaning chunks (default: 1)")
+    parser.add_argument("--preprocess-cache", default=CACHE_FOLDER, help=f"cleaned inputs (default: {CACHE_FOLDER})")
+
+
+def add_transcribe_options(parser):
+    parser.add_argument("--model", default="turbo", help="Whisper model name (default: turbo)")
+    parser.add_argument("--device", default=None, help="torch device (default: CUDA if available)")
+    parser.add_argument("--dtype", choices=DTYPES, default=None, help="default: float32")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--interop-threads", type=int, default=None, help="torch inter-op threads")
+    parser.add_argument("--batch-size", type=int, default=16, help="slices decoded together (default: 16)")
+    parser.add_argument("--language", default=None, help="spoken language (default: detect)")
+    parser.add_argument("--speaker", default=SPEAKER_NAME, help=f"speaker_name column (default: {SPEAKER_NAME})")
+    parser.add_argument("--metadata-format", default=METADATA_FORMAT, help=f"row format (default: {METADATA_FORMAT})")
+    parser.add_argument("--header", default=HEADER_ROW, help=f"CSV header row (default: {HEADER_ROW})")
+
+
+def add_run_options(parser):
+    parser.add_argument("--mode", choices=["slices", "source"], default="slices",
+                        help="one Whisper pass per slice, or one per source file split by cut (default: slices)")
+    parser.add_argument("--snap", action="store_true", help="in source mode, move cuts inside words to their edge")
+    parser.add_argument("--queue-size", type=int, default=64, help="slices buffered ahead of Whisper")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    common.add_argument("--no-incremental", action="store_true",
+                        help="clear the output folder and redo everything instead of only changed inputs")
+    common.add_argument("--timings", action="store_true",
+                        help="print the time spent per stage and its real-time factor at the end")
+    common.add_argument("--profile", metavar="FILE", help="write cProfile stats of the main thread to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    slice_parser = commands.add_parser("slice", parents=[common], help="slice the audio files of a folder")
+    slice_parser.add_argument("input", help="folder with the source .wav/.mp3 files")
+    slice_parser.add_argument("output", help="folder the slices are written to")
+    add_slice_options(slice_parser)
+    slice_parser.add_argument("--workers", type=int, default=1, help="slicing processes (default: 1)")
+    slice_parser.add_argument("--region-length", type=int, default=10 * 60,
+                              help="with several workers, slice files longer than twice this many seconds "
+                                   "in parallel regions (default: 600)")
+    slice_parser.set_defaults(func=slice_command)
+
+    transcribe_parser = commands.add_parser("transcribe", parents=[common], help="transcribe a folder of slices")
+    transcribe_parser.add_argument("output", help="folder holding the slices")
+    add_transcribe_options(transcribe_parser)
+    transcribe_parser.set_defaults(func=transcribe_command)
+
+    run_parser = commands.add_parser("run", parents=[common], help="slice a folder and transcribe the slices as they are written")
+    run_parser.add_argument("input", help="folder with the source .wav/.mp3 files")
+    run_parser.add_argument("output", help="folder the slices are written to")
+    add_slice_options(run_parser)
+    add_transcribe_options(run_parser)
+    add_run_options(run_parser)
+    run_parser.set_defaults(func=run_command)
+
+    watch_parser = commands.add_parser("watch", parents=[common],
+                                       help="keep slicing (and transcribing) the new recordings of a folder tree")
+    watch_parser.add_argument("input", help="folder tree recordings are dropped into, scanned recursively")
+    watch_parser.add_argument("output", help="output tree; each input folder gets the folder at the same path")
+    add_slice_options(watch_parser)
+    watch_parser.add_argument("--workers", type=int, default=1, help="slicing processes (default: 1)")
+    watch_parser.add_argument("--region-length", type=int, default=10 * 60,
+                              help="region length for --workers > 1, in seconds (default: 600)")
+    watch_parser.add_argument("--transcribe", action="store_true", help="also transcribe the slices, as `run` does")
+    add_transcribe_options(watch_parser)
+    add_run_options(watch_parser)
+    watch_parser.add_argument("--interval", type=float, default=SCAN_INTERVAL,
+                              help=f"seconds between scans (default: {SCAN_INTERVAL})")
+    watch_parser.add_argument("--once", action="store_true",
+                              help="exit once every file found has been handled instead of watching")
+    watch_parser.set_defaults(func=watch_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with profiled(args.profile) if args.profile else nullcontext():
+        status = args.func(args)
+    if args.timings:
+        print_timings(REGISTRY.summary())
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
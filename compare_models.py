@@ -0,0 +1,115 @@
+"""
+Compare Whisper speed and accuracy across model sizes, dtypes and thread counts.
+
+The sample set is a folder of short audio files plus a references file with
+one `file_name|reference text` line per clip (the same pipe layout as
+transcriptions.csv). Every configuration transcribes the whole set after one
+warm-up clip, and reports wall time, real-time factor and word error rate:
+
+    python compare_models.py samples/ --models small,turbo --dtypes float32,int8 --threads 4,8
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from decoder import duration
+from models import ModelRegistry, configure_threads
+from transcribe import get_audio_files, transcribe_batch
+
+
+def load_references(path):
+    """Read `file_name|text` lines into a dict."""
+    references = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            name, _, text = line.rstrip("\n").partition("|")
+            if text:
+                references[name] = text
+    return references
+
+
+def normalize(text):
+    """Lowercase and drop punctuation so WER only counts word differences."""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """Return the word-level edit distance between two texts and the reference length."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def run_config(audio_files, references, name, dtype, device, threads, batch_size):
+    """Transcribe the sample set with one configuration and return its measurements."""
+    if threads:
+        configure_threads(threads)
+    registry = ModelRegistry(max_models=1)
+    started = time.perf_counter()
+    model = registry.get(name, device, dtype)
+    load_seconds = time.perf_counter() - started
+
+    transcribe_batch(model, audio_files[:1], batch_size=1)  # warm-up
+    started = time.perf_counter()
+    texts = transcribe_batch(model, audio_files, batch_size=batch_size)
+    seconds = time.perf_counter() - started
+
+    errors = words = 0
+    for file_path, text in zip(audio_files, texts):
+        reference = references.get(os.path.basename(file_path))
+        if reference is not None:
+            file_errors, file_words = word_errors(reference, text)
+            errors += file_errors
+            words += file_words
+    audio_seconds = sum(duration(file_path) for file_path in audio_files) / 1000
+    return {
+        "model": name,
+        "dtype": dtype,
+        "device": str(model.device),
+        "threads": threads,
+        "load_seconds": round(load_seconds, 2),
+        "seconds": round(seconds, 2),
+        "real_time_factor": round(seconds / audio_seconds, 4),
+        "wer": round(errors / words, 4) if words else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("samples", help="folder with the sample clips")
+    parser.add_argument("--references", help="file_name|text references (default: <samples>/references.csv)")
+    parser.add_argument("--models", default="turbo", help="comma-separated Whisper model names")
+    parser.add_argument("--dtypes", default="float32,int8", help="comma-separated dtypes: float32, float16, int8")
+    parser.add_argument("--threads", default="0", help="comma-separated intra-op thread counts (0: torch default)")
+    parser.add_argument("--device", default=None, help="torch device for float models (default: CUDA if available)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    audio_files = get_audio_files(args.samples)
+    references = load_references(args.references or os.path.join(args.samples, "references.csv"))
+    results = []
+    print(f"{'model':<10} {'dtype':<8} {'device':<7} {'threads':>7} {'seconds':>8} {'RTF':>7} {'WER':>7}")
+    for threads in sorted(int(count) for count in args.threads.split(",")):
+        for name in args.models.split(","):
+            for dtype in args.dtypes.split(","):
+                result = run_config(audio_files, references, name, dtype, args.device, threads or None,
+                                    args.batch_size)
+                results.append(result)
+                wer = "-" if result["wer"] is None else f"{result['wer']:.3f}"
+                print(f"{name:<10} {dtype:<8} {result['device']:<7} {threads or '-':>7} "
+                      f"{result['seconds']:>8.1f} {result['real_time_factor']:>7.3f} {wer:>7}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
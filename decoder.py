@@ -0,0 +1,252 @@
+import struct
+import subprocess
+
+import numpy as np
+import soundfile as sf
+import soxr
+from pydub.utils import get_encoder_name, mediainfo_json
+
+BLOCK_FRAMES = 1 << 16
+
+# soundfile subtype -> (read dtype, right shift, sample width), chosen so the
+# decoded samples equal the ones pydub keeps in memory for the same file.
+# pydub widens 24-bit samples by appending a sign byte below the original three.
+WAV_SUBTYPES = {
+    "PCM_U8": ("int16", 8, 1),
+    "PCM_S8": ("int16", 8, 1),
+    "PCM_16": ("int16", 0, 2),
+    "PCM_24": ("int32", 0, 4),
+    "PCM_32": ("int32", 0, 4),
+}
+NARROW_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+# WAV sample widths whose bytes are already in pydub's layout and can be mapped as is
+MAPPABLE_WIDTHS = {2: np.dtype("<i2"), 4: np.dtype("<i4")}
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def probe(file_path):
+    """
+    Read the stream parameters of a .wav or .mp3 file without decoding it.
+
+    Parameters:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        tuple: (frame_rate, channels, sample_width) of the decoded samples.
+    """
+    if file_path.lower().endswith('.wav'):
+        info = sf.info(file_path)
+        if info.subtype not in WAV_SUBTYPES:
+            raise ValueError(f"Unsupported WAV encoding for streaming: {info.subtype}")
+        return info.samplerate, info.channels, WAV_SUBTYPES[info.subtype][2]
+
+    stream = next(s for s in mediainfo_json(file_path)['streams'] if s['codec_type'] == 'audio')
+    # pydub decodes mp3 to 16-bit PCM, so the stream is piped out the same way
+    return int(stream['sample_rate']), int(stream['channels']), 2
+
+
+def _wav_layout(file_path):
+    """
+    Find the PCM data of a RIFF/WAVE file.
+
+    Returns:
+        tuple: (data_offset, data_bytes, frame_rate, channels, sample_width),
+        or None when the file is not plain integer PCM.
+    """
+    with open(file_path, "rb") as file:
+        header = file.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = file.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                body = file.read(size)
+                audio_format, channels, frame_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    audio_format = struct.unpack("<H", body[24:26])[0]
+                fmt = audio_format, channels, frame_rate, bits
+            elif chunk_id == b"data":
+                if fmt is None or fmt[0] != WAVE_FORMAT_PCM:
+                    return None
+                _, channels, frame_rate, bits = fmt
+                offset = file.tell()
+                # Streamed WAVs may leave the size unset; the data then runs to the end of the file
+                file.seek(0, 2)
+                size = min(size, file.tell() - offset)
+                return offset, size, frame_rate, channels, bits // 8
+            else:
+                file.seek(size, 1)
+            if size % 2:
+                file.seek(1, 1)  # chunks are word aligned
+
+
+def map_wav(file_path):
+    """
+    Memory-map the samples of a 16- or 32-bit PCM WAV file.
+
+    The samples are a view on the file, so they cost page cache rather than
+    heap and slicing them copies nothing; bytes are only materialised when a
+    slice is written. 8- and 24-bit files need converting to pydub's sample
+    layout and are not mapped.
+
+    Parameters:
+        file_path (str): Path to the .wav file.
+
+    Returns:
+        tuple: (samples, frame_rate, sample_width) where samples is a read-only
+        (frames, channels) array, or None when the file cannot be mapped.
+    """
+    layout = _wav_layout(file_path)
+    if layout is None:
+        return None
+    offset, size, frame_rate, channels, sample_width = layout
+    if sample_width not in MAPPABLE_WIDTHS or not channels:
+        return None
+    frames = size // (channels * sample_width)
+    if not frames:
+        return None
+    samples = np.memmap(file_path, dtype=MAPPABLE_WIDTHS[sample_width], mode="r", offset=offset,
+                        shape=(frames, channels))
+    return samples, frame_rate, sample_width
+
+
+def duration(file_path):
+    """
+    Return the duration of a .wav or .mp3 file in milliseconds without decoding it.
+
+    Parameters:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        float: Duration in milliseconds (approximate for MP3).
+    """
+    if file_path.lower().endswith('.wav'):
+        info = sf.info(file_path)
+        return 1000 * info.frames / info.samplerate
+    return 1000 * float(mediainfo_json(file_path)['format']['duration'])
+
+
+def resample_blocks(blocks, frame_rate, full_scale, sample_rate):
+    """
+    Convert a stream of integer frames, block by block, to mono float32 at another rate.
+
+    Parameters:
+        blocks (iterable): Frames of shape (frames, channels) in file order.
+        frame_rate (int): Sample rate of the frames.
+        full_scale (float): Magnitude of a full-scale sample.
+        sample_rate (int): Sample rate of the result.
+
+    Returns:
+        numpy.ndarray: Mono float32 samples in [-1, 1].
+    """
+    resampler = soxr.ResampleStream(frame_rate, sample_rate, 1, dtype="float32")
+    parts = [
+        resampler.resample_chunk(block.astype(np.float32).mean(axis=1) / full_scale)
+        for block in blocks
+    ]
+    parts.append(resampler.resample_chunk(np.zeros(0, np.float32), last=True))
+    return np.concatenate(parts)
+
+
+def iter_blocks(file_path, block_frames=BLOCK_FRAMES, start_frame=0, end_frame=None):
+    """
+    Decode a .wav or .mp3 file block by block.
+
+    WAV files are read with soundfile; MP3 files are decoded by an ffmpeg
+    process writing raw 16-bit PCM to a pipe. Only one block is held in
+    memory at a time.
+
+    Parameters:
+        file_path (str): Path to the audio file.
+        block_frames (int): Number of frames per block.
+        start_frame (int): First frame to decode (default: start of the file).
+        end_frame (int): Frame to stop before (default: end of the file).
+
+    Yields:
+        numpy.ndarray: Blocks of shape (frames, channels) with pydub's sample layout.
+    """
+    if file_path.lower().endswith('.wav'):
+        with sf.SoundFile(file_path) as audio_file:
+            dtype, shift, sample_width = WAV_SUBTYPES[audio_file.subtype]
+            start_frame = min(start_frame, audio_file.frames)
+            audio_file.seek(start_frame)
+            frames = -1 if end_frame is None else max(min(end_frame, audio_file.frames) - start_frame, 0)
+            for block in audio_file.blocks(block_frames, frames=frames, dtype=dtype, always_2d=True):
+                if shift:
+                    block = (block >> shift).astype(NARROW_DTYPES[sample_width])
+                if audio_file.subtype == "PCM_24":
+                    block |= np.where(block < 0, 0xFF, 0).astype(block.dtype)
+                yield block
+        return
+
+    frame_rate, channels, sample_width = probe(file_path)
+    command = [get_encoder_name(), "-v", "error", "-i", file_path, "-vn"]
+    if start_frame or end_frame is not None:
+        # atrim counts decoded samples, so a range decodes to exactly the
+        # frames the full decode has at those positions.
+        trim = f"atrim=start_sample={start_frame}"
+        if end_frame is not None:
+            trim += f":end_sample={end_frame}"
+        command += ["-af", trim]
+    command += ["-acodec", "pcm_s16le", "-f", "s16le", "-"]
+    frame_width = channels * sample_width
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        pending = b""
+        while True:
+            data = process.stdout.read(block_frames * frame_width)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_width
+            pending = data[usable:]
+            yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, channels)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"Decoding {file_path} failed: {stderr.decode(errors='replace')}")
+
+
+def iter_cut_samples(blocks, cuts, start_frame=0):
+    """
+    Yield the samples of each planned cut from a stream of blocks.
+
+    Only the frames from the current cut's start onwards are kept, so memory
+    stays bounded by the longest cut plus one block however long the file is.
+
+    Parameters:
+        blocks (iterable): Blocks of shape (frames, channels) in file order.
+        cuts (list): Cut tuples in file order.
+        start_frame (int): Frame of the file the first block starts at.
+
+    Yields:
+        tuple: (cut, samples) where samples may be shorter than the cut at the
+        end of the file.
+    """
+    blocks = iter(blocks)
+    buffer = None
+    offset = start_frame  # frame index of buffer[0]
+    for cut in cuts:
+        while buffer is None or offset + len(buffer) < cut.end_frame:
+            block = next(blocks, None)
+            if block is None:
+                break
+            buffer = block if buffer is None else np.concatenate((buffer, block))
+            # Drop frames no remaining cut needs
+            drop = min(max(cut.start_frame - offset, 0), len(buffer))
+            buffer = buffer[drop:]
+            offset += drop
+        if buffer is None:
+            return
+        drop = min(max(cut.start_frame - offset, 0), len(buffer))
+        buffer = buffer[drop:]
+        offset += drop
+        yield cut, buffer[:max(cut.end_frame - offset, 0)]
@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from metrics import timed
+from shards import SHARD_FORMAT
+from silence import segment_samples
+
+# How slices are written: container ("wav", "flac" or "shard", see shards.py),
+# sample rate and bit depth
+OutputFormat = namedtuple("OutputFormat", ["format", "sample_rate", "bit_depth"])
+DEFAULT_OUTPUT = OutputFormat("wav", 22050, 16)
+
+# (container, bit depth) -> soundfile subtype
+SUBTYPES = {
+    ("wav", 8): "PCM_U8",
+    ("wav", 16): "PCM_16",
+    ("wav", 24): "PCM_24",
+    ("wav", 32): "PCM_32",
+    ("flac", 8): "PCM_S8",
+    ("flac", 16): "PCM_16",
+    ("flac", 24): "PCM_24",
+    (SHARD_FORMAT, 16): None,  # raw int16 frames, written by shards.ShardWriter
+}
+# Integer type handed to soundfile for each bit depth; soundfile reads
+# full-scale int16/int32 and narrows to the subtype.
+WRITE_DTYPES = {8: np.int16, 16: np.int16, 24: np.int32, 32: np.int32}
+RESAMPLE_QUALITY = "HQ"
+
+
+def output_extension(output):
+    """Return the file extension of slices written in the given OutputFormat."""
+    # Slices inside shards are plain names
+    return "" if output.format == SHARD_FORMAT else f".{output.format}"
+
+
+class SliceEncoder:
+    """
+    Resample and write the slices of one source file.
+
+    Samples stay NumPy arrays from the source buffer to the output file: they
+    are resampled with soxr and written with soundfile, skipping pydub's
+    audioop conversions and export. One resampler is kept for all the slices
+    of a source and reset between slices, so its filter is only designed once.
+    """
+
+    def __init__(self, frame_rate, channels, sample_width, output=DEFAULT_OUTPUT):
+        """
+        Parameters:
+            frame_rate (int): Sample rate of the source.
+            channels (int): Channel count of the source.
+            sample_width (int): Bytes per sample of the source (pydub layout).
+            output (OutputFormat): How slices are written.
+        """
+        if (output.format, output.bit_depth) not in SUBTYPES:
+            raise ValueError(f"Unsupported output: {output.bit_depth}-bit {output.format}")
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.output = output
+        self._subtype = SUBTYPES[(output.format, output.bit_depth)]
+        self._resampler = None
+        if frame_rate != output.sample_rate:
+            self._resampler = soxr.ResampleStream(frame_rate, output.sample_rate, channels,
+                                                  dtype="float32", quality=RESAMPLE_QUALITY)
+
+    @classmethod
+    def for_segment(cls, audio_segment, output=DEFAULT_OUTPUT):
+        """Return an encoder for slices with the parameters of audio_segment."""
+        return cls(audio_segment.frame_rate, audio_segment.channels, audio_segment.sample_width, output)
+
+    def encode(self, samples):
+        """
+        Convert source samples to the output rate and bit depth.
+
+        Parameters:
+            samples (numpy.ndarray): Frames of shape (frames, channels) in the
+                source layout, see silence.segment_samples.
+
+        Returns:
+            numpy.ndarray: Frames ready for soundfile, see WRITE_DTYPES.
+        """
+        with timed("resample", len(samples) / self.frame_rate):
+            return self._encode(samples)
+
+    def _encode(self, samples):
+        bit_depth = self.output.bit_depth
+        if self._resampler is None and 8 * self.sample_width == bit_depth:
+            # Same rate and width: write the source samples as they are
+            return np.ascontiguousarray(self._widen(samples, bit_depth))
+
+        full_scale = float(1 << (8 * self.sample_width - 1))
+        audio = samples.astype(np.float32) / full_scale
+        if self._resampler is not None:
+            audio = self._resampler.resample_chunk(np.ascontiguousarray(audio), last=True)
+            self._resampler.clear()
+
+        # In float64: at 32 bits float32 rounds scale - 1 up to 2 ** 31, which
+        # wraps to the most negative int32
+        scale = float(1 << (bit_depth - 1))
+        audio = np.clip(np.rint(audio.astype(np.float64) * scale), -scale, scale - 1)
+        return self._widen(audio.astype(np.int32), bit_depth)
+
+    @staticmethod
+    def _widen(samples, bit_depth):
+        """Left-align samples of the given bit depth in the dtype soundfile is given."""
+        dtype = WRITE_DTYPES[bit_depth]
+        shift = 8 * np.dtype(dtype).itemsize - bit_depth
+        return (samples.astype(dtype) << shift) if shift else samples.astype(dtype, copy=False)
+
+    def write(self, samples, output_path):
+        """
+        Write one slice.
+
+        Parameters:
+            samples (numpy.ndarray): Frames of shape (frames, channels) in the source layout.
+            output_path (str): Path of the file to write.
+        """
+        encoded = self.encode(samples)
+        with timed("export", len(encoded) / self.output.sample_rate):
+            sf.write(output_path, encoded, self.output.sample_rate,
+                     subtype=self._subtype, format=self.output.format.upper())
+
+    def write_segment(self, audio_segment, output_path):
+        """Write an AudioSegment with this encoder's source parameters."""
+        self.write(segment_samples(audio_segment), output_path)
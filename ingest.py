@@ -0,0 +1,194 @@
+"""
+Continuous ingest of a tree of recordings.
+
+A WatchFolder scans an input tree recursively and remembers the size and
+modification time of every file it has handed out, so a rescan only reports
+files that are new or changed since. A file is only reported once it looks
+the same on two scans in a row: a recorder still writing it changes its size
+or mtime in between. Each input directory maps to the directory at the same
+relative path in the output tree, which is an incremental output folder of
+its own (slices, manifest.json and transcriptions.csv), so recordings with
+the same name on different days do not collide.
+
+    watch = WatchFolder("recordings", "dataset")
+    for batch in watch.poll(interval=30):
+        for folder in batch.folders:
+            ...  # slice / transcribe folder.file_paths into folder.output_folder
+            watch.commit(folder)
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+INDEX_NAME = "ingest_index.json"
+INDEX_VERSION = 1
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+SCAN_INTERVAL = 30  # seconds between scans when watching
+
+# One input directory with work to do: file_paths are its settled audio files
+# (unchanged and newly ready alike, so its outputs can be rebuilt), ready the
+# new or changed ones among them and removed the relative paths of files that
+# are gone since they were ingested.
+IngestFolder = namedtuple("IngestFolder", ["input_folder", "output_folder", "file_paths", "ready", "removed"])
+# Result of one scan: folders with work to do and the files still being written.
+ScanResult = namedtuple("ScanResult", ["folders", "waiting"])
+
+
+def scan_tree(root, skip=()):
+    """
+    List the audio files under root, recursively.
+
+    Hidden files and directories (starting with a dot) are left out, and
+    symbolic links to directories are not followed.
+
+    Parameters:
+        root (str): Folder to scan.
+        skip (iterable): Real paths of directories to leave out, e.g. an
+            output tree inside the input tree.
+
+    Yields:
+        tuple: (path, size, mtime_ns) of each .wav and .mp3 file.
+    """
+    skip = {os.path.realpath(path) for path in skip}
+    folders = [root]
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(folder) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue  # removed (or made unreadable) since its parent was listed
+        for entry in reversed(entries):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.realpath(entry.path) not in skip:
+                        folders.append(entry.path)
+                elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+
+class WatchFolder:
+    """
+    Find the new and changed recordings of an input tree, scan after scan.
+
+    The index of ingested files is kept in the output tree (INDEX_NAME), so
+    a restarted watcher carries on where the previous one stopped. Files are
+    only entered into it by commit(), once the caller has handled them; a
+    folder that failed is reported again on the next scan.
+    """
+
+    def __init__(self, input_folder, output_folder):
+        """
+        Parameters:
+            input_folder (str): Root of the tree recordings are dropped into.
+            output_folder (str): Root of the mirrored output tree.
+        """
+        self.input_folder = os.path.abspath(input_folder)
+        self.output_folder = os.path.abspath(output_folder)
+        self.path = os.path.join(self.output_folder, INDEX_NAME)
+        self._index = {}  # relative path -> [size, mtime_ns] when ingested
+        self._seen = {}  # relative path -> (size, mtime_ns) of unsettled files at the last scan
+        self._ready = {}  # relative path -> (size, mtime_ns) of files handed out and not committed yet
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == INDEX_VERSION:
+                self._index = data["files"]
+
+    def save(self):
+        """Write the index, replacing the previous copy atomically."""
+        os.makedirs(self.output_folder, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "files": self._index}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+    def scan(self):
+        """
+        Scan the input tree once.
+
+        Returns:
+            ScanResult: The folders with settled new, changed or removed
+            files, in path order, and the number of files still being written.
+        """
+        current = {
+            os.path.relpath(path, self.input_folder): (size, mtime)
+            for path, size, mtime in scan_tree(self.input_folder, skip=[self.output_folder])
+        }
+        changed = {name: stat for name, stat in current.items() if self._index.get(name) != list(stat)}
+        # Files handed out but not committed (e.g. their folder failed) count as seen
+        previous = {**self._seen, **self._ready}
+        ready = {name for name, stat in changed.items() if previous.get(name) == stat}
+        self._seen = {name: stat for name, stat in changed.items() if name not in ready}
+        self._ready = {name: changed[name] for name in ready}
+        removed = [name for name in self._index if name not in current]
+
+        folders = {}
+        for name in sorted(ready) + removed:
+            folders.setdefault(os.path.dirname(name), ([], []))[0 if name in ready else 1].append(name)
+        result = []
+        for folder, (ready_names, removed_names) in sorted(folders.items()):
+            input_folder = os.path.normpath(os.path.join(self.input_folder, folder))
+            if not os.path.isdir(input_folder):
+                # The whole directory went away: keep its output, only forget its files
+                self._forget(removed_names)
+                continue
+            settled = sorted(
+                name for name in current
+                if os.path.dirname(name) == folder and name not in self._seen
+            )
+            result.append(IngestFolder(
+                input_folder,
+                os.path.normpath(os.path.join(self.output_folder, folder)),
+                [os.path.join(self.input_folder, name) for name in settled],
+                [os.path.join(self.input_folder, name) for name in ready_names],
+                removed_names,
+            ))
+        return ScanResult(result, len(self._seen))
+
+    def commit(self, folder):
+        """
+        Record the ready files of a scanned folder as ingested, after the caller handled them.
+
+        Files are recorded with the size and mtime they had when the scan
+        found them settled, so a file changed while it was being handled is
+        reported again.
+        """
+        for file_path in folder.ready:
+            name = os.path.relpath(file_path, self.input_folder)
+            if name in self._ready:
+                self._index[name] = list(self._ready.pop(name))
+        self._forget(folder.removed)
+
+    def _forget(self, names):
+        for name in names:
+            self._index.pop(name, None)
+        self.save()
+
+    def poll(self, interval=SCAN_INTERVAL, once=False):
+        """
+        Scan the tree every interval seconds.
+
+        Parameters:
+            interval (float): Seconds between the start of two scans.
+            once (bool): Stop after the first scan that finds nothing waiting
+                to settle, e.g. to ingest a finished tree and exit.
+
+        Yields:
+            ScanResult: The result of each scan, including empty ones.
+        """
+        while True:
+            started = time.monotonic()
+            result = self.scan()
+            yield result
+            if once and not result.waiting:
+                return
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,219 @@
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from metrics import Metrics, collect, profiled
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's task when the job has been cancelled."""
+
+
+class FolderBusy(Exception):
+    """Raised when a job is submitted for an output folder another active job is using."""
+
+
+class Job:
+    """
+    One unit of work submitted to a JobScheduler, with its own progress.
+
+    The task function receives the job and reports through it: emit() sends
+    a progress message to the job's room only, and check_cancelled() is
+    called between slices/batches so a cancel stops the task promptly. The
+    stage timings of the job's work are collected in job.metrics.
+    """
+
+    def __init__(self, kind, lane, folder, emit):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.lane = lane
+        self.folder = folder
+        self.status = QUEUED
+        self.message = "Queued"
+        self.current = 0
+        self.total = 100
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.metrics = Metrics()
+        self._emit = emit
+
+    def emit(self, payload):
+        """Record a progress update and send it to the job's room."""
+        self.message = payload.get("message", self.message)
+        self.current = payload.get("current", self.current)
+        self.total = payload.get("total", self.total)
+        if payload.get("isError") is True:
+            self.error = self.message
+        if self._emit:
+            self._emit(dict(payload, job_id=self.id, status=self.status), self.id)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled."""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        """Return the job's state as JSON-serialisable data."""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "lane": self.lane,
+            "folder": self.folder,
+            "status": self.status,
+            "message": self.message,
+            "current": self.current,
+            "total": self.total,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "timings": self.metrics.summary(),
+        }
+
+
+class JobScheduler:
+    """
+    Run jobs on bounded, separate worker lanes.
+
+    Each lane is its own thread pool, so CPU-bound slicing jobs and
+    model-inference jobs do not queue behind each other, and each lane's
+    concurrency is capped independently. Only one active job may use an
+    output folder at a time, so concurrent jobs cannot clear or overwrite
+    each other's slices.
+    """
+
+    def __init__(self, lanes, emit=None, keep_finished=100, profile_dir=None):
+        """
+        Parameters:
+            lanes (dict): Lane name -> number of jobs it runs at once.
+            emit (callable): emit(payload, room) sending a progress message
+                to the clients watching a job (default: None, no messages).
+            keep_finished (int): Finished jobs kept for status queries.
+            profile_dir (str): Folder receiving a cProfile `<job id>.prof`
+                of every job's thread (default: None, no profiling).
+        """
+        self._executors = {
+            lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{lane}-job")
+            for lane, workers in lanes.items()
+        }
+        self._emit = emit
+        self.keep_finished = keep_finished
+        self.profile_dir = profile_dir
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, lane, task, *args, folder=None):
+        """
+        Queue task(job, *args) on a lane.
+
+        Parameters:
+            kind (str): What the job does, e.g. "process" or "transcribe".
+            lane (str): Lane to run on.
+            task (callable): Called with the Job followed by args.
+            folder (str): Output folder the job writes to.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            FolderBusy: Another queued or running job uses folder.
+        """
+        if lane not in self._executors:
+            raise ValueError(f"Unknown lane: {lane}")
+        with self._lock:
+            if folder is not None:
+                folder = os.path.abspath(folder)
+                for other in self._jobs.values():
+                    if other.folder == folder and other.status not in FINISHED:
+                        raise FolderBusy(f"{folder} is in use by job {other.id}")
+            job = Job(kind, lane, folder, self._emit)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executors[lane].submit(self._run, job, task, args)
+        return job
+
+    def _run(self, job, task, args):
+        if job.cancelled:
+            self._finish(job, CANCELLED, "Cancelled")
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        profile = nullcontext()
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile = profiled(os.path.join(self.profile_dir, f"{job.id}.prof"))
+        try:
+            with collect(job.metrics), profile:
+                task(job, *args)
+        except JobCancelled:
+            self._finish(job, CANCELLED, "Cancelled")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED, f"Error: {e}", isError=True)
+        else:
+            # A task reports failures it handles itself with isError messages
+            status = CANCELLED if job.cancelled else FAILED if job.error else DONE
+            self._finish(job, status, job.message, isError=job.error is not None)
+
+    def _finish(self, job, status, message, **extra):
+        job.status = status
+        job.finished = time.time()
+        job.emit(dict({"message": message, "current": job.current, "total": job.total,
+                       "timings": job.metrics.summary()}, **extra))
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_finished."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in itertools.islice(finished, max(len(finished) - self.keep_finished, 0)):
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return a job by ID, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """Return all known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued job never starts, a running one stops at its
+        next check_cancelled().
+
+        Returns:
+            bool: False if there is no such job or it has already finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED, "Cancelled")
+        return True
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and wait for the running ones."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
@@ -1,25 +1,60 @@
 import os
 import time
-from flask import Flask, request, render_template_string, jsonify
-from flask_socketio import SocketIO, emit
-import whisper
+from contextlib import contextmanager
+from flask import Flask, Response, request, render_template_string, jsonify
+from flask_socketio import SocketIO, emit, join_room
+from encoder import OutputFormat
+from jobs import FINISHED, QUEUED, RUNNING, FolderBusy, JobScheduler
+from metrics import REGISTRY, format_metric
+from manifest import Manifest
+from models import ModelRegistry
+from preprocess import CACHE_FOLDER, preprocess_folder, remove_view
+from pipeline import list_slices, slice_and_transcribe, slice_and_transcribe_sources, transcribe_slices
+from shards import SHARD_FORMAT
 from slicer import slice_audio
-from transcribe import get_audio_files, transcribe_audio, save_transcriptions_to_csv
+from transcribe import TranscriptionWriter, format_row, get_audio_files
     
 # Global Variables
 INPUT_FOLDER = os.path.join(os.getcwd(), 'temp_audio')
 OUTPUT_FOLDER_NAME = 'output'
 AUDIO_MIN_LENGTH = 3  # in seconds (default value)
 AUDIO_MAX_LENGTH = 11  # in seconds (default value)
+PLANNER = 'greedy'  # cut planner: 'greedy', 'optimal' or 'vad' (needs silero-vad)
+STREAMING = False  # decode inputs block by block to bound memory on very long files
+SLICE_WORKERS = 1  # processes slicing input files in parallel
+PREPROCESS = ''  # clean the inputs before slicing: '' (off), 'denoise' (noisereduce) or 'vocals' (Demucs)
+PREPROCESS_WORKERS = 1  # processes cleaning chunks of a file in parallel
+PREPROCESS_CACHE = CACHE_FOLDER  # cleaned inputs by content hash and settings, shared with cli.py
+SLICE_REGION_LENGTH = 10 * 60  # in seconds; with several workers, longer files are sliced in parallel regions
+SLICE_FORMAT = 'wav'  # 'wav', 'flac', or 'shard' to pack slices into large shard files (16-bit only, not incremental)
+SLICE_SAMPLE_RATE = 22050  # sample rate of the written slices
+SLICE_BIT_DEPTH = 16  # 8, 16, 24 (or 32 for WAV)
+WHISPER_MODEL = 'turbo'  # 'tiny', 'base', 'small', 'medium', 'large-v3' or 'turbo'; smaller is faster on CPU
+WHISPER_DEVICE = None  # None picks CUDA when available, else CPU
+WHISPER_DTYPE = None  # None for float32, 'float16', or 'int8' for quantized CPU inference
+WHISPER_THREADS = None  # torch intra-op threads; set below the core count to leave room for slicing
+WHISPER_INTEROP_THREADS = None  # torch inter-op threads
+WHISPER_MAX_MODELS = 2  # models kept loaded at once
+WHISPER_MAX_BYTES = None  # memory budget for loaded models, in bytes
+WHISPER_WARMUP = True  # load WHISPER_MODEL when the server starts
+TRANSCRIBE_BATCH_SIZE = 16  # slices decoded together by Whisper
+PIPELINE_QUEUE_SIZE = 64  # sliced clips buffered ahead of Whisper in Process & Transcribe
+TRANSCRIBE_MODE = 'slices'  # Process & Transcribe: 'slices' (one Whisper pass per slice) or 'source' (one per input file, words split by cut)
+SNAP_TO_WORDS = False  # in 'source' mode, move cut points that fall inside a word to its edge
+INCREMENTAL = True  # keep earlier slices and transcripts, redo only inputs that changed
+SLICING_JOBS = 2  # slicing-only jobs run at once
+INFERENCE_JOBS = 1  # jobs using Whisper run at once; more share the same model and CPU/GPU
+PROFILE_DIR = None  # folder for a cProfile <job id>.prof of each job's main thread; None disables profiling
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
+model_registry = ModelRegistry(max_models=WHISPER_MAX_MODELS, max_bytes=WHISPER_MAX_BYTES,
+                               intra_op_threads=WHISPER_THREADS, inter_op_threads=WHISPER_INTEROP_THREADS)
 
-progress = {
-    "current": 0,
-    "total": 100,
-    "message": "Starting..."
-}
+# Progress of a job only goes to the clients that joined its room
+scheduler = JobScheduler({'slicing': SLICING_JOBS, 'inference': INFERENCE_JOBS},
+                         emit=lambda payload, room: socketio.emit("progress", payload, to=room),
+                         profile_dir=PROFILE_DIR)
 
 HEADER_ROW = "audio_file|text|speaker_name"
 METADATA_FORMAT = "{audio_file}|{text}|{speaker_name}"
@@ -35,34 +70,80 @@ def ensure_output_folder(output_folder):
     else:
         os.makedirs(output_folder)
 
-def main(input_folder, output_folder_name, audio_min_length, audio_max_length):
-    output_folder = f'temp_audio/{output_folder_name}/sliced'
-    progress['current'] = 1
-    socketio.emit("progress", {"message": f"Create folder {output_folder}", "current": progress['current'], "total": 100})
-    ensure_output_folder(output_folder)
-    
-    sliced_files = slice_audio(input_folder, output_folder, audio_min_length, audio_max_length)
-    total_files = 0
-    for idx, file_name in enumerate(sliced_files):
-        progress['current'] = progress['current'] + 1
-        socketio.emit("progress", {"message": f"Slicing {file_name}", "current": progress['current'], "total": 100})
-        total_files = total_files + 1
-
-    if total_files == 0:
-        socketio.emit("progress", {
-            "message": "Error: No files found in the input folder",
-            "current": 100,
-            "total": 100,
-            "isError": True
-        })
+def sliced_folder(output_folder_name):
+    """Return the slice folder of an output folder name, which must be a plain name inside temp_audio."""
+    if output_folder_name in ('', '.', '..') or os.path.basename(output_folder_name) != output_folder_name:
+        raise ValueError(f"Invalid output folder name: {output_folder_name!r}")
+    return f'temp_audio/{output_folder_name}/sliced'
+
+def whisper_model_key():
+    """Identify the configured Whisper model in the manifest, so a model change invalidates transcripts."""
+    return f"{WHISPER_MODEL}:{WHISPER_DTYPE or 'float32'}"
+
+def slice_output():
+    """Return the configured format of the written slices."""
+    return OutputFormat(SLICE_FORMAT, SLICE_SAMPLE_RATE, SLICE_BIT_DEPTH)
+
+def open_manifest(output_folder):
+    """Return the manifest of output_folder for incremental runs, or None when INCREMENTAL is off."""
+    return Manifest(output_folder) if INCREMENTAL and SLICE_FORMAT != SHARD_FORMAT else None
+
+@contextmanager
+def preprocess_input(job, input_folder, method):
+    """Give the folder to slice: input_folder, or a view of the cleaned copies of its files when method is set."""
+    if not method:
+        yield input_folder
         return
 
-    socketio.emit("progress", {
-        "message": "Processing complete!",
-        "current": total_files,
-        "total": total_files,
-        "isError": False
-    })
+    def on_progress(file_path, done, total):
+        job.check_cancelled()
+        job.emit({"message": f"Preprocessing {os.path.basename(file_path)} ({method}, chunk {done}/{total})",
+                  "current": done, "total": total})
+
+    view_folder, _ = preprocess_folder(input_folder, PREPROCESS_CACHE, method, PREPROCESS_WORKERS,
+                                       on_progress=on_progress)
+    try:
+        yield view_folder
+    finally:
+        remove_view(view_folder)
+
+def main(job, input_folder, output_folder_name, audio_min_length, audio_max_length, planner=PLANNER, streaming=STREAMING, workers=SLICE_WORKERS, preprocess=PREPROCESS):
+    output_folder = sliced_folder(output_folder_name)
+    with preprocess_input(job, input_folder, preprocess) as input_folder:
+        current = 1
+        job.emit({"message": f"Create folder {output_folder}", "current": current, "total": 100})
+        manifest = open_manifest(output_folder)
+        if manifest is None:
+            ensure_output_folder(output_folder)
+    
+        sliced_files = slice_audio(input_folder, output_folder, audio_min_length, audio_max_length, planner, streaming, workers,
+                                   SLICE_REGION_LENGTH * 1000, manifest, slice_output())
+        total_files = 0
+        for idx, file_name in enumerate(sliced_files):
+            job.check_cancelled()
+            current = current + 1
+            job.emit({"message": f"Slicing {file_name}", "current": current, "total": 100})
+            total_files = total_files + 1
+
+        if total_files == 0 and manifest is not None and get_audio_files(output_folder):
+            job.emit({"message": "Processing complete! All slices were up to date.", "current": 100, "total": 100, "isError": False})
+            return
+
+        if total_files == 0:
+            job.emit({
+                "message": "Error: No files found in the input folder",
+                "current": 100,
+                "total": 100,
+                "isError": True
+            })
+            return
+
+        job.emit({
+            "message": "Processing complete!",
+            "current": total_files,
+            "total": total_files,
+            "isError": False
+        })
 
 # Flask routes
 
@@ -206,9 +287,41 @@ def index():
                 </div>
             </div>
 
+            <div class="form-group">
+                <label for="planner">Cut Planner:</label>
+                <select id="planner" name="planner">
+                    <option value="greedy" {% if PLANNER == 'greedy' %}selected{% endif %}>Greedy (window by window)</option>
+                    <option value="optimal" {% if PLANNER == 'optimal' %}selected{% endif %}>Optimal (whole file, longest silences)</option>
+                    <option value="vad" {% if PLANNER == 'vad' %}selected{% endif %}>Voice activity (Silero VAD pauses)</option>
+                </select>
+            </div>
+
+            <div class="form-group">
+                <label for="preprocess">Preprocessing:</label>
+                <select id="preprocess" name="preprocess">
+                    <option value="" {% if not PREPROCESS %}selected{% endif %}>None</option>
+                    <option value="denoise" {% if PREPROCESS == 'denoise' %}selected{% endif %}>Denoise (noisereduce)</option>
+                    <option value="vocals" {% if PREPROCESS == 'vocals' %}selected{% endif %}>Vocals only (Demucs, slow)</option>
+                </select>
+            </div>
+
+            <div class="form-group">
+                <label for="streaming">
+                    <input type="checkbox" id="streaming" name="streaming" value="1" {% if STREAMING %}checked{% endif %}>
+                    Low-memory streaming (for very long recordings)
+                </label>
+            </div>
+
+            <div class="form-group">
+                <label for="workers">Slicing Processes:</label>
+                <input type="number" id="workers" name="workers" min="1" value="{{ SLICE_WORKERS }}">
+            </div>
+
             <div class="buttons">
                 <button type="button" onclick="startProcessing()">Process Audio</button>
                 <button type="button" onclick="startTranscription()" id="transcribe-btn">Start Transcription</button>
+                <button type="button" onclick="startPipeline()">Process &amp; Transcribe</button>
+                <button type="button" onclick="cancelJob()" id="cancel-btn" disabled>Cancel</button>
             </div>
         </form>
 
@@ -230,7 +343,11 @@ def index():
                     metadata_format: localStorage.getItem('metadata_format'),
                     header_row: localStorage.getItem('header_row'),
                     audio_min_length: localStorage.getItem('audio_min_length'),
-                    audio_max_length: localStorage.getItem('audio_max_length')
+                    audio_max_length: localStorage.getItem('audio_max_length'),
+                    planner: localStorage.getItem('planner'),
+                    preprocess: localStorage.getItem('preprocess'),
+                    streaming: localStorage.getItem('streaming'),
+                    workers: localStorage.getItem('workers')
                 };
 
                 // Apply saved settings to form
@@ -257,6 +374,18 @@ def index():
                     document.getElementById('max_length').value = savedSettings.audio_max_length;
                     document.getElementById('max_length_value').textContent = savedSettings.audio_max_length;
                 }
+                if (savedSettings.planner) {
+                    document.getElementById('planner').value = savedSettings.planner;
+                }
+                if (savedSettings.preprocess !== null) {
+                    document.getElementById('preprocess').value = savedSettings.preprocess;
+                }
+                if (savedSettings.streaming) {
+                    document.getElementById('streaming').checked = savedSettings.streaming === 'true';
+                }
+                if (savedSettings.workers) {
+                    document.getElementById('workers').value = savedSettings.workers;
+                }
 
                 async function validatePath(path) {
                     try {
@@ -289,6 +418,36 @@ def index():
                     localStorage.setItem('header_row', form.header_row.value);
                     localStorage.setItem('audio_min_length', form.audio_min_length.value);
                     localStorage.setItem('audio_max_length', form.audio_max_length.value);
+                    localStorage.setItem('planner', form.planner.value);
+                    localStorage.setItem('preprocess', form.preprocess.value);
+                    localStorage.setItem('streaming', form.streaming.checked);
+                    localStorage.setItem('workers', form.workers.value);
+                }
+
+                // Progress messages are only shown for the job started from this page
+                let currentJobId = null;
+
+                function watchJob(response) {
+                    return response.json().then(data => {
+                        const progressText = document.getElementById('progress-text');
+                        if (!response.ok) {
+                            progressText.textContent = 'Error: ' + data.error;
+                            progressText.style.color = 'red';
+                            return data;
+                        }
+                        currentJobId = data.job_id;
+                        document.getElementById('cancel-btn').disabled = false;
+                        progressText.textContent = 'Queued (job ' + data.job_id + ')';
+                        progressText.style.color = '#666';
+                        socket.emit('join', { job_id: data.job_id });
+                        return data;
+                    });
+                }
+
+                function cancelJob() {
+                    if (currentJobId) {
+                        fetch('/jobs/' + currentJobId + '/cancel', { method: 'POST' });
+                    }
                 }
 
                 function startProcessing() {
@@ -300,7 +459,7 @@ def index():
                     fetch('/process', {
                         method: 'POST',
                         body: formData
-                    }).then(response => response.text())
+                    }).then(watchJob)
                     .then(data => {
                         console.log(data);
                     }).catch(error => {
@@ -318,7 +477,7 @@ def index():
                     fetch('/transcribe', {
                         method: 'POST',
                         body: formData
-                    }).then(response => response.text())
+                    }).then(watchJob)
                     .then(data => {
                         console.log(data);
                         transcribeBtn.disabled = false;
@@ -330,8 +489,28 @@ def index():
                     });
                 }
 
+                function startPipeline() {
+                    const formData = new FormData(document.getElementById('process-form'));
+                    saveSettings()
+                    fetch('/process-transcribe', {
+                        method: 'POST',
+                        body: formData
+                    }).then(watchJob)
+                    .then(data => {
+                        console.log(data);
+                    }).catch(error => {
+                        console.error('Error:', error);
+                    });
+                }
+
                 // Handle progress updates
                 socket.on('progress', data => {
+                    if (data.job_id !== currentJobId) {
+                        return;
+                    }
+                    if (['done', 'failed', 'cancelled'].includes(data.status)) {
+                        document.getElementById('cancel-btn').disabled = true;
+                    }
                     const progressBar = document.getElementById('progress');
                     const progressText = document.getElementById('progress-text');
                     
@@ -361,6 +540,11 @@ def index():
 
                 // Handle successful connection
                 socket.on('connect', () => {
+                    if (currentJobId) {
+                        // Rooms are per connection: rejoin after a reconnect
+                        socket.emit('join', { job_id: currentJobId });
+                        return;
+                    }
                     const progressText = document.getElementById('progress-text');
                     if (progressText) {
                         progressText.textContent = 'Connected - ready to process';
@@ -371,7 +555,18 @@ def index():
             </script>
 </body>
 </html>
-''', INPUT_FOLDER=INPUT_FOLDER, OUTPUT_FOLDER_NAME=OUTPUT_FOLDER_NAME, AUDIO_MIN_LENGTH=AUDIO_MIN_LENGTH, AUDIO_MAX_LENGTH=AUDIO_MAX_LENGTH)
+''', INPUT_FOLDER=INPUT_FOLDER, OUTPUT_FOLDER_NAME=OUTPUT_FOLDER_NAME, AUDIO_MIN_LENGTH=AUDIO_MIN_LENGTH, AUDIO_MAX_LENGTH=AUDIO_MAX_LENGTH, PLANNER=PLANNER, PREPROCESS=PREPROCESS, STREAMING=STREAMING, SLICE_WORKERS=SLICE_WORKERS)
+
+def submit_job(kind, lane, task, output_folder_name, *args):
+    """Queue a job writing to output_folder_name and return the JSON response with its ID."""
+    try:
+        output_folder = sliced_folder(output_folder_name)
+        job = scheduler.submit(kind, lane, task, *args, folder=output_folder)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FolderBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'job_id': job.id, 'status': job.status})
 
 @app.route('/process', methods=['POST'])
 def process():
@@ -381,10 +576,16 @@ def process():
     audio_max_length = int(request.form.get('audio_max_length')) if request.form.get('audio_max_length') else AUDIO_MAX_LENGTH
     audio_min_length = audio_min_length * 1000
     audio_max_length = audio_max_length * 1000
+    planner = request.form.get('planner') or PLANNER
+    streaming = request.form.get('streaming') == '1'
+    try:
+        workers = max(1, int(request.form.get('workers'))) if request.form.get('workers') else SLICE_WORKERS
+    except ValueError:
+        return jsonify({'error': f"Invalid number of workers: {request.form.get('workers')}"}), 400
+    preprocess = request.form.get('preprocess', PREPROCESS)
 
-    socketio.start_background_task(main, input_folder, output_folder_name, audio_min_length, audio_max_length)
-
-    return 'Processing started. Monitor progress in the progress bar.'
+    return submit_job('process', 'slicing', main, output_folder_name, input_folder, output_folder_name,
+                      audio_min_length, audio_max_length, planner, streaming, workers, preprocess)
 
 @app.route('/validate-path', methods=['POST'])
 def validate_path():
@@ -406,52 +607,172 @@ def transcribe():
     speaker_name = request.form.get('speaker_name') or SPEAKER_NAME
     metadata_format = request.form.get('metadata_format') or METADATA_FORMAT
     header_row = request.form.get('header_row') or HEADER_ROW
+    output_folder_name = request.form.get('output_folder_name') or OUTPUT_FOLDER_NAME
     
-    def transcribe_task(speaker_name, metadata_format, header_row):
-        try:
-            # Update progress
-            progress['current'] = 0
-            progress['total'] = 100
-            socketio.emit("progress", {"message": "Loading Whisper model...", "current": 0, "total": 100})
-            
-            # Get audio files
-            output_folder = f'temp_audio/{OUTPUT_FOLDER_NAME}/sliced'
-            audio_files = get_audio_files(output_folder)
-            
-            if not audio_files:
-                socketio.emit("progress", {
-                    "message": "Error: No audio files found in output folder",
+    def transcribe_task(job, speaker_name, metadata_format, header_row):
+        job.emit({"message": "Loading Whisper model...", "current": 0, "total": 100})
+        
+        # Get audio files
+        output_folder = sliced_folder(output_folder_name)
+        audio_files, shard_reader = list_slices(output_folder)
+        
+        if not audio_files:
+            job.emit({
+                "message": "Error: No audio files found in output folder",
+                "current": 100,
+                "total": 100,
+                "isError": True
+            })
+            return
+        
+        manifest = open_manifest(output_folder)
+        model_key = whisper_model_key()
+
+        def row_key(file_path):
+            # A row only counts as done for the same file, model and row format
+            return f"{file_path}|{model_key}|{speaker_name}|{metadata_format}"
+
+        with TranscriptionWriter(output_folder, header_row) as writer:
+            done = writer.resume([row_key(file_path) for file_path in audio_files])
+            rows = transcribe_slices(audio_files[done:],
+                                     lambda: model_registry.get(WHISPER_MODEL, WHISPER_DEVICE, WHISPER_DTYPE),
+                                     TRANSCRIBE_BATCH_SIZE, shard_reader=shard_reader, manifest=manifest,
+                                     model_key=model_key)
+            for idx, (file_path, text) in enumerate(rows, done + 1):
+                job.check_cancelled()
+                job.emit({"message": f"Transcribed {os.path.basename(file_path)} ({idx}/{len(audio_files)})",
+                          "current": idx, "total": len(audio_files)})
+                writer.write(format_row(metadata_format, file_path, text, speaker_name), row_key(file_path))
+            if manifest is not None:
+                manifest.save()
+        
+        job.emit({"message": "Transcription complete!", "current": len(audio_files), "total": len(audio_files)})
+
+    return submit_job('transcribe', 'inference', transcribe_task, output_folder_name,
+                      speaker_name, metadata_format, header_row)
+
+@app.route('/process-transcribe', methods=['POST'])
+def process_transcribe():
+    input_folder = request.form.get('input_folder') or INPUT_FOLDER
+    output_folder_name = request.form.get('output_folder_name') or OUTPUT_FOLDER_NAME
+    audio_min_length = int(request.form.get('audio_min_length')) if request.form.get('audio_min_length') else AUDIO_MIN_LENGTH
+    audio_max_length = int(request.form.get('audio_max_length')) if request.form.get('audio_max_length') else AUDIO_MAX_LENGTH
+    planner = request.form.get('planner') or PLANNER
+    streaming = request.form.get('streaming') == '1'
+    preprocess = request.form.get('preprocess', PREPROCESS)
+    speaker_name = request.form.get('speaker_name') or SPEAKER_NAME
+    metadata_format = request.form.get('metadata_format') or METADATA_FORMAT
+    header_row = request.form.get('header_row') or HEADER_ROW
+
+    def pipeline_task(job):
+        output_folder = sliced_folder(output_folder_name)
+        with preprocess_input(job, input_folder, preprocess) as source_folder:
+            job.emit({"message": "Loading Whisper model...", "current": 0, "total": 100})
+            model = model_registry.get(WHISPER_MODEL, WHISPER_DEVICE, WHISPER_DTYPE)
+
+            model_key = whisper_model_key()
+            counts = {'sliced': 0, 'transcribed': 0}
+
+            def report(message):
+                # The bar tracks transcription against the slices produced so far
+                job.emit({
+                    "message": f"{message} (sliced {counts['sliced']}, transcribed {counts['transcribed']})",
+                    "current": counts['transcribed'],
+                    "total": max(counts['sliced'], 1),
+                    "sliced": counts['sliced'],
+                    "transcribed": counts['transcribed'],
+                })
+
+            def on_sliced(file_path):
+                counts['sliced'] += 1
+                report(f"Sliced {os.path.basename(file_path)}")
+
+            if TRANSCRIBE_MODE == 'source':
+                model_key = f"{model_key}:source"
+                slices = slice_and_transcribe_sources(source_folder, output_folder, audio_min_length * 1000,
+                                                      audio_max_length * 1000, model, planner, streaming,
+                                                      snap=SNAP_TO_WORDS, on_sliced=on_sliced,
+                                                      manifest=open_manifest(output_folder), model_key=model_key,
+                                                      output=slice_output())
+            else:
+                slices = slice_and_transcribe(source_folder, output_folder, audio_min_length * 1000, audio_max_length * 1000,
+                                              model, TRANSCRIBE_BATCH_SIZE, planner, streaming,
+                                              queue_size=PIPELINE_QUEUE_SIZE, on_sliced=on_sliced,
+                                              manifest=open_manifest(output_folder), model_key=model_key,
+                                              output=slice_output())
+            # Opened with the first row: the output folder is prepared once slicing starts
+            writer = None
+            try:
+                for idx, (file_path, text) in enumerate(slices):
+                    job.check_cancelled()
+                    counts['transcribed'] = idx + 1
+                    report(f"Transcribed {os.path.basename(file_path)}")
+                    if writer is None:
+                        writer = TranscriptionWriter(output_folder, header_row)
+                    writer.write(format_row(metadata_format, file_path, text, speaker_name),
+                                 f"{file_path}|{model_key}|{speaker_name}|{metadata_format}")
+            except BaseException:
+                # Stops the slicing thread as well
+                slices.close()
+                if writer is not None:
+                    writer.abort()
+                raise
+
+            if writer is None:
+                job.emit({
+                    "message": "Error: No files found in the input folder",
                     "current": 100,
                     "total": 100,
                     "isError": True
                 })
                 return
-            
-            model = whisper.load_model("turbo")
-            transcriptions = []
-            
-            for idx, file_path in enumerate(audio_files):
-                progress['current'] = progress['current'] + 1
-                progress_message = f"Processing {os.path.basename(file_path)} ({idx + 1}/{len(audio_files)})"
-                socketio.emit("progress", {"message": progress_message, "current": idx + 1, "total": len(audio_files)})
-                
-                full_path = os.path.abspath(file_path)
-                text = transcribe_audio(model, file_path).strip()
-                output_line = metadata_format.format(
-                    audio_file=full_path,
-                    text=text,
-                    speaker_name=speaker_name
-                )
-                transcriptions.append(output_line)
-
-            save_transcriptions_to_csv(transcriptions, output_folder, header_row)    
-            
-            socketio.emit("progress", {"message": "Transcription complete!", "current": len(audio_files), "total": len(audio_files)})
-        except Exception as e:
-            socketio.emit("progress", {"message": f"Error: {str(e)}", "current": 100, "total": 100})
-
-    socketio.start_background_task(transcribe_task, speaker_name, metadata_format, header_row)
-    return 'Transcription started'
+
+            writer.close()
+            job.emit({"message": "Processing and transcription complete!", "current": writer.rows, "total": writer.rows})
+
+    return submit_job('process-transcribe', 'inference', pipeline_task, output_folder_name)
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify([job.to_dict() for job in scheduler.jobs()])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    cancelled = scheduler.cancel(job_id)
+    return jsonify(dict(job.to_dict(), cancelled=cancelled))
+
+@app.route('/metrics')
+def metrics():
+    # Stage totals of every job since the server started, plus the jobs by status
+    statuses = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+    for job in scheduler.jobs():
+        statuses[job.status] += 1
+    lines = format_metric('audioslicer_jobs', 'gauge', 'Known jobs by status.', 'status', statuses)
+    return Response(REGISTRY.prometheus() + "\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+@socketio.on('join')
+def join_job(data):
+    # A client watches a job by joining the room named after its ID
+    job = scheduler.get(data.get('job_id'))
+    if job is None:
+        return
+    join_room(job.id)
+    emit('progress', dict(job.to_dict(), isError=job.error is not None))
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
+    debug = True
+    # The debug reloader runs the script twice; its parent only watches files, so skip it
+    reloader_parent = debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    if WHISPER_WARMUP and not reloader_parent:
+        socketio.start_background_task(model_registry.warm_up, [WHISPER_MODEL], WHISPER_DEVICE, WHISPER_DTYPE)
+    socketio.run(app, debug=debug)
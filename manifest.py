@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20
+SAVE_EVERY = 50  # transcripts recorded between manifest writes
+
+
+def file_hash(file_path):
+    """
+    Return the content hash of a file.
+
+    Parameters:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hex BLAKE2b digest of the file's bytes.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Record of the work done in an output folder, kept next to the slices.
+
+    For every input file it stores the content hash, the slicing parameters
+    and the slices they produced; for every slice, the content hash, the model
+    that transcribed it and the text. A later run over the same folder only
+    slices inputs whose content or parameters changed and only transcribes
+    slices it has no text for, which also lets an interrupted run resume where
+    it stopped.
+
+    Input files are recorded once all their slices are written, so a file
+    that was half-sliced when a run died is sliced again from scratch.
+    """
+
+    def __init__(self, output_folder):
+        """
+        Parameters:
+            output_folder (str): Folder holding the slices and the manifest file.
+        """
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._data = {"version": MANIFEST_VERSION, "inputs": {}, "transcripts": {}}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == MANIFEST_VERSION:
+                self._data = data
+
+    def save(self):
+        """Write the manifest, replacing the previous copy atomically."""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        self._unsaved = 0
+
+    def _hash(self, file_path, entry):
+        """Hash file_path, reusing the stored hash when size and mtime are unchanged."""
+        stat = os.stat(file_path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+            return entry["hash"], stat
+        return file_hash(file_path), stat
+
+    def is_sliced(self, file_path, params):
+        """
+        Whether the slices of an input file are up to date.
+
+        Parameters:
+            file_path (str): Path to the input file.
+            params (dict): Slicing parameters the run would use.
+
+        Returns:
+            bool: True when the file, the parameters and every recorded slice
+            are unchanged since the file was last sliced.
+        """
+        name = os.path.basename(file_path)
+        with self._lock:
+            entry = self._data["inputs"].get(name)
+        if not entry or entry["params"] != params:
+            return False
+        if self._hash(file_path, entry)[0] != entry["hash"]:
+            return False
+        return all(os.path.exists(os.path.join(self.output_folder, s)) for s in entry["slices"])
+
+    def discard_slices(self, file_path):
+        """
+        Delete the recorded slices of an input file and forget them, before it
+        is sliced again. Slices another input also records (inputs with the
+        same stem, e.g. x.wav and x.mp3, write the same names) are kept.
+        """
+        name = os.path.basename(file_path)
+        with self._lock:
+            entry = self._data["inputs"].pop(name, None)
+            if not entry:
+                return
+            shared = {filename for other in self._data["inputs"].values() for filename in other["slices"]}
+            owned = [filename for filename in entry["slices"] if filename not in shared]
+            for filename in owned:
+                self._data["transcripts"].pop(filename, None)
+        for filename in owned:
+            slice_path = os.path.join(self.output_folder, filename)
+            if os.path.exists(slice_path):
+                os.remove(slice_path)
+
+    def record_slices(self, file_path, params, slices):
+        """
+        Record an input file as sliced.
+
+        Parameters:
+            file_path (str): Path to the input file.
+            params (dict): Slicing parameters used.
+            slices (list): Names of the slice files written for it, in order.
+        """
+        name = os.path.basename(file_path)
+        with self._lock:
+            file_digest, stat = self._hash(file_path, self._data["inputs"].get(name))
+            self._data["inputs"][name] = {
+                "hash": file_digest,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "params": params,
+                "slices": list(slices),
+            }
+            self._save()
+
+    def slices(self, file_path):
+        """Return the slice file names recorded for an input file."""
+        with self._lock:
+            entry = self._data["inputs"].get(os.path.basename(file_path))
+        return list(entry["slices"]) if entry else []
+
+    def prune(self, file_paths):
+        """
+        Delete the slices of inputs that are no longer in the input folder.
+
+        Parameters:
+            file_paths (list): Paths of the current input files.
+        """
+        current = {os.path.basename(file_path) for file_path in file_paths}
+        with self._lock:
+            stale = [name for name in self._data["inputs"] if name not in current]
+        for name in stale:
+            self.discard_slices(os.path.join(self.output_folder, name))
+        if stale:
+            self.save()
+
+    def transcript(self, slice_path, model_key):
+        """
+        Return the stored text of a slice, or None if it has to be transcribed.
+
+        Parameters:
+            slice_path (str): Path to the slice file.
+            model_key (str): Identifies the model and settings used to transcribe.
+
+        Returns:
+            str: The text, when the slice content and model are unchanged.
+        """
+        with self._lock:
+            entry = self._data["transcripts"].get(os.path.basename(slice_path))
+        if not entry or entry["model"] != model_key:
+            return None
+        if self._hash(slice_path, entry)[0] != entry["hash"]:
+            return None
+        return entry["text"]
+
+    def record_transcript(self, slice_path, model_key, text):
+        """
+        Store the text of a slice. The manifest is written every SAVE_EVERY
+        transcripts; call save() at the end of a run.
+
+        Parameters:
+            slice_path (str): Path to the slice file.
+            model_key (str): Identifies the model and settings used to transcribe.
+            text (str): The transcript.
+        """
+        with self._lock:
+            entry = self._data["transcripts"].get(os.path.basename(slice_path))
+            file_digest, stat = self._hash(slice_path, entry)
+            self._data["transcripts"][os.path.basename(slice_path)] = {
+                "hash": file_digest,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "model": model_key,
+                "text": text,
+            }
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
@@ -0,0 +1,196 @@
+import contextvars
+import cProfile
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Pipeline stages timed by the slicing and transcription code
+STAGES = (
+    "decode",            # reading and decoding source audio
+    "preprocess",        # denoising or vocal separation before slicing
+    "silence",           # building the silence envelope
+    "vad",               # finding pauses with the voice activity detector
+    "plan",              # choosing cut points
+    "cut",               # cutting slices and checking them for silence
+    "resample",          # converting slices to the output rate and bit depth
+    "export",            # writing slice files or shards
+    "whisper_resample",  # converting slices to 16 kHz for Whisper
+    "model_load",        # loading a Whisper model
+    "inference",         # Whisper encoding and decoding
+)
+
+
+class Metrics:
+    """
+    Running totals per stage: calls, wall seconds and seconds of audio handled.
+
+    The real-time factor of a stage is its seconds divided by its audio
+    seconds, so below 1 the stage keeps up with real time.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, audio_seconds=0.0, calls=1):
+        with self._lock:
+            totals = self._totals.setdefault(stage, [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += audio_seconds
+
+    def state(self):
+        """Return the totals as plain data, e.g. to send them back from a worker process."""
+        with self._lock:
+            return {stage: list(totals) for stage, totals in self._totals.items()}
+
+    def summary(self):
+        """
+        Return the totals per stage, in pipeline order.
+
+        Returns:
+            dict: Stage -> {"calls", "seconds", "audio_seconds",
+            "real_time_factor"}; the factor is None for stages without audio.
+        """
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        state = sorted(self.state().items(), key=lambda item: order.get(item[0], len(order)))
+        return {
+            stage: {
+                "calls": calls,
+                "seconds": round(seconds, 4),
+                "audio_seconds": round(audio_seconds, 3),
+                "real_time_factor": round(seconds / audio_seconds, 4) if audio_seconds else None,
+            }
+            for stage, (calls, seconds, audio_seconds) in state
+        }
+
+    def prometheus(self, prefix="audioslicer"):
+        """Return the totals in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = []
+        for name, kind, help_text, key in (
+            ("stage_seconds_total", "counter", "Wall time spent in each pipeline stage.", "seconds"),
+            ("stage_calls_total", "counter", "Times each pipeline stage ran.", "calls"),
+            ("stage_audio_seconds_total", "counter", "Seconds of audio handled by each pipeline stage.", "audio_seconds"),
+            ("stage_real_time_factor", "gauge", "Stage seconds per second of audio.", "real_time_factor"),
+        ):
+            lines.extend(format_metric(f"{prefix}_{name}", kind, help_text, "stage", {
+                stage: totals[key] for stage, totals in summary.items() if totals[key] is not None
+            }))
+        return "\n".join(lines) + "\n"
+
+
+def format_metric(name, kind, help_text, label, values):
+    """Return the Prometheus text lines of one metric with one label."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f'{name}{{{label}="{value_label}"}} {value}' for value_label, value in values.items())
+    return lines
+
+
+# Totals of this process, served by the web app's /metrics
+REGISTRY = Metrics()
+# Further collectors (e.g. the running job's) that stages in this context record into
+_collectors = contextvars.ContextVar("metrics_collectors", default=())
+
+
+def record(stage, seconds, audio_seconds=0.0, calls=1):
+    """Add one measurement to the process totals and to every active collector."""
+    REGISTRY.add(stage, seconds, audio_seconds, calls)
+    for metrics in _collectors.get():
+        metrics.add(stage, seconds, audio_seconds, calls)
+
+
+def record_state(state):
+    """Add totals collected elsewhere (see Metrics.state), e.g. in a worker process."""
+    for stage, (calls, seconds, audio_seconds) in state.items():
+        record(stage, seconds, audio_seconds, calls)
+
+
+@contextmanager
+def collect(metrics):
+    """Also record the stages run in this context, and the threads started with in_context, into metrics."""
+    token = _collectors.set(_collectors.get() + (metrics,))
+    try:
+        yield metrics
+    finally:
+        _collectors.reset(token)
+
+
+def in_context(fn):
+    """Wrap fn to run in a copy of the current context, so another thread records into the same collectors."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class _Span:
+    def __init__(self, audio_seconds, calls):
+        self.audio_seconds = audio_seconds
+        self.calls = calls
+        self.exclude = 0.0
+
+
+@contextmanager
+def timed(stage, audio_seconds=0.0, calls=1):
+    """
+    Time a block as one run of a stage.
+
+    The block can set audio_seconds (and calls) on the yielded span when they
+    are only known at the end, e.g. after decoding, and exclude the seconds
+    of a nested stage that it already recorded separately.
+    """
+    span = _Span(audio_seconds, calls)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        record(stage, time.perf_counter() - started - span.exclude, span.audio_seconds, span.calls)
+
+
+class timed_iter:
+    """
+    Iterate over an iterable, timing only the time spent producing its items.
+
+    With frame_rate, items are arrays of frames and their duration is counted
+    as audio seconds. One measurement is recorded when iteration ends; the
+    totals stay readable on the seconds and audio_seconds attributes.
+    """
+
+    def __init__(self, stage, iterable, frame_rate=None):
+        self.stage = stage
+        self.iterable = iterable
+        self.frame_rate = frame_rate
+        self.seconds = 0.0
+        self.audio_seconds = 0.0
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.seconds += time.perf_counter() - started
+                if self.frame_rate:
+                    self.audio_seconds += len(item) / self.frame_rate
+                yield item
+        finally:
+            record(self.stage, self.seconds, self.audio_seconds)
+
+
+@contextmanager
+def profiled(path):
+    """
+    Run a block under cProfile and write the stats to path (for pstats or snakeviz).
+
+    Only the calling thread is profiled, not threads or processes it starts.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
@@ -0,0 +1,201 @@
+import threading
+from collections import OrderedDict
+
+from metrics import timed
+
+# torch and whisper are imported where they are used, so importing this
+# module (and the slicing code that imports it) stays fast and works
+# without them installed.
+
+
+def default_device():
+    """Return the device Whisper models run on when none is requested."""
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _tensors(value):
+    """Yield the tensors in a state_dict value (quantized layers store tuples of them)."""
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _tensors(item)
+
+
+def model_size(model):
+    """Return the memory taken by a model's weights and buffers, in bytes."""
+    tensors = [t for value in model.state_dict().values() for t in _tensors(value)]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Set the torch CPU thread pools of this process.
+
+    Parameters:
+        intra_op (int): Threads used inside one operator, e.g. a matrix multiply
+            (default: None, keep torch's default of one per core).
+        inter_op (int): Threads running independent operators concurrently.
+            Torch only accepts this before its first parallel work, so a late
+            call leaves the pool as it is.
+    """
+    import torch
+
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass
+
+
+def quantize(model):
+    """
+    Return a CPU model with int8 dynamic quantization of its Linear layers.
+
+    The Linear layers hold nearly all of Whisper's weights and compute; their
+    weights are stored as int8 and activations are quantized on the fly, so
+    the model is about 4x smaller in memory and faster on CPUs with int8
+    matrix multiply support.
+
+    Whisper's layers are whisper.model.Linear, a subclass that only casts
+    its weights to the input dtype, and quantize_dynamic matches exact
+    types; they are turned into plain nn.Linear layers in place first.
+
+    Raises:
+        RuntimeError: If no layer ended up quantized.
+    """
+    import torch
+
+    model = model.cpu()
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if not any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in quantized.modules()):
+        raise RuntimeError("Dynamic quantization left no Linear layer quantized")
+    return quantized
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models.
+
+    Each (name, device, dtype) combination is loaded once and shared by every
+    request that asks for it. Loading holds a per-model lock, so overlapping
+    requests wait for the same load instead of reading the weights twice.
+    When more models are configured than fit, the least recently used one is
+    dropped from the cache (requests still holding it keep it alive until they
+    finish).
+    """
+
+    def __init__(self, max_models=2, max_bytes=None, intra_op_threads=None, inter_op_threads=None):
+        """
+        Parameters:
+            max_models (int): Number of models kept loaded at most.
+            max_bytes (int): Memory budget for cached models, in bytes
+                (default: None, only max_models applies).
+            intra_op_threads (int): Torch intra-op threads for CPU inference,
+                applied before the first model loads (default: None, torch's default).
+            inter_op_threads (int): Torch inter-op threads, likewise.
+        """
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._threads_configured = False
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _key(self, name, device, dtype):
+        if dtype and dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype: {dtype}")
+        if dtype == "int8":
+            # Dynamic quantization only has CPU kernels
+            return name, "cpu", dtype
+        return name, device or default_device(), dtype or "float32"
+
+    def get(self, name="turbo", device=None, dtype=None):
+        """
+        Return a loaded model, loading it on first use.
+
+        Parameters:
+            name (str): Whisper model name, e.g. "turbo" or "small".
+            device (str): Torch device (default: CUDA when available, else CPU).
+            dtype (str): "float32" (default), "float16", or "int8" for a
+                quantized CPU model (the device is then always CPU).
+
+        Returns:
+            whisper.model.Whisper: The shared model instance.
+        """
+        key = self._key(name, device, dtype)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+            model = self._load(*key)
+            with self._lock:
+                self._store(key, model)
+                self._load_locks.pop(key, None)
+            return model
+
+    def _load(self, name, device, dtype):
+        import whisper
+
+        if not self._threads_configured:
+            configure_threads(self.intra_op_threads, self.inter_op_threads)
+            self._threads_configured = True
+        with timed("model_load"):
+            model = whisper.load_model(name, device=device)
+            if dtype == "float16":
+                model = model.half()
+            elif dtype == "int8":
+                model = quantize(model)
+            return model.eval()
+
+    def _store(self, key, model):
+        """Cache a freshly loaded model, evicting least recently used ones to make room."""
+        size = model_size(model)
+        while self._models and (
+            len(self._models) >= self.max_models
+            or (self.max_bytes is not None and sum(self._sizes.values()) + size > self.max_bytes)
+        ):
+            evicted, _ = self._models.popitem(last=False)
+            del self._sizes[evicted]
+        self._models[key] = model
+        self._sizes[key] = size
+
+    def warm_up(self, names, device=None, dtype=None):
+        """
+        Load models ahead of the first request.
+
+        Parameters:
+            names (list): Whisper model names to load.
+            device (str): Torch device (default: CUDA when available, else CPU).
+            dtype (str): "float32" (default), "float16" or "int8".
+        """
+        for name in names:
+            self.get(name, device, dtype)
+
+    def loaded(self):
+        """Return the (name, device, dtype) keys of the cached models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
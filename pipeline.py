@@ -0,0 +1,447 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soxr
+
+from alignment import assign_words, snap_cuts, transcribe_words
+from decoder import iter_blocks, resample_blocks
+from encoder import DEFAULT_OUTPUT, SliceEncoder
+from metrics import in_context, timed, timed_iter
+from planner import split_regions
+from shards import SHARD_FORMAT, ShardReader, ShardWriter, has_shards
+from silence import BLOCK_FRAMES, segment_samples
+from slicer import (clear_output_folder, file_envelope, iter_file_slices, iter_planned_slices, list_input_files,
+                    plan_file_cuts, save_slices, slice_params, slice_path)
+from transcribe import get_audio_files, transcribe_batch
+
+WHISPER_SAMPLE_RATE = 16000
+SOURCE_REGION_LENGTH = 10 * 60 * 1000  # in ms; source mode holds one region at a time as Whisper input
+
+_DONE = object()  # end-of-stream marker on the slice queue
+
+
+def whisper_samples(audio_segment):
+    """
+    Return a slice as the mono 16 kHz float32 samples Whisper consumes.
+
+    Parameters:
+        audio_segment (AudioSegment): The slice at its source sample rate.
+
+    Returns:
+        numpy.ndarray: Samples in [-1, 1], resampled with soxr.
+    """
+    return resample_for_whisper(segment_samples(audio_segment), audio_segment.frame_rate,
+                                audio_segment.max_possible_amplitude)
+
+
+def whisper_shard_samples(shard_reader, slice_name):
+    """Return a slice stored in shards as the samples Whisper consumes, see whisper_samples."""
+    samples, sample_rate = shard_reader.audio(slice_name)
+    return resample_for_whisper(samples, sample_rate, float(np.iinfo(samples.dtype).max + 1))
+
+
+def resample_for_whisper(samples, frame_rate, full_scale):
+    """
+    Convert integer frames to the mono 16 kHz float32 samples Whisper consumes.
+
+    Parameters:
+        samples (numpy.ndarray): Frames of shape (frames, channels).
+        frame_rate (int): Sample rate of the frames.
+        full_scale (float): Magnitude of a full-scale sample.
+
+    Returns:
+        numpy.ndarray: Samples in [-1, 1], resampled with soxr.
+    """
+    with timed("whisper_resample", len(samples) / frame_rate):
+        samples = samples.astype(np.float32).mean(axis=1) / full_scale
+        return soxr.resample(samples, frame_rate, WHISPER_SAMPLE_RATE).astype(np.float32)
+
+
+def slice_and_transcribe(input_folder, output_folder, min_length, max_length, model, batch_size=16,
+                         planner="greedy", streaming=False, language=None, queue_size=64, on_sliced=None,
+                         manifest=None, model_key=None, output=DEFAULT_OUTPUT, file_paths=None):
+    """
+    Slice audio files and transcribe the slices in one pipelined pass.
+
+    Slicing runs on a producer thread that feeds a bounded queue; the caller's
+    thread consumes it in batches and runs Whisper, so the two stages overlap
+    and the whole run takes about as long as the slower stage. When the queue
+    is full the slicer waits, which keeps memory bounded.
+
+    Slices go straight from the slicer to Whisper as in-memory 16 kHz buffers,
+    skipping the round trip through the written WAV and an ffmpeg decode per
+    slice. The slice files are still written as the dataset artifact, on a
+    background thread.
+
+    Parameters:
+        input_folder (str): Path to the folder containing input .wav or .mp3 files.
+        output_folder (str): Path to save the slices.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        model: Loaded Whisper model.
+        batch_size (int): Slices transcribed together.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+        streaming (bool): Decode inputs block by block, see slicer.slice_file.
+        language (str): Spoken language, or None to detect it per slice.
+        queue_size (int): Slices buffered between the two stages at most.
+        on_sliced (callable): Called from the slicing thread with each slice
+            path as it is queued, to report progress of the first stage.
+        manifest (Manifest): Keep the output folder and reuse the slices and
+            transcripts it records for unchanged inputs (default: None, start
+            from an empty folder).
+        model_key (str): Identifies the model and settings in the manifest.
+        output (OutputFormat): Container, sample rate and bit depth of the slice
+            files. With the "shard" format the slices are appended to shards
+            and the transcripts are stored in the shard indexes at the end.
+        file_paths (list): Only handle these input files of input_folder,
+            see slicer.slice_audio (default: None, every .wav/.mp3 file in it).
+
+    Yields:
+        tuple: (slice_path, text) for each written slice, once its file is on disk.
+    """
+    sharded = output.format == SHARD_FORMAT
+    if sharded and manifest is not None:
+        raise ValueError("Shard output does not support incremental runs")
+    input_paths = list_input_files(input_folder)
+    file_paths = input_paths if file_paths is None else list(file_paths)
+    params = slice_params(min_length, max_length, planner, output)
+    if manifest is None:
+        clear_output_folder(output_folder)
+    else:
+        os.makedirs(output_folder, exist_ok=True)
+        manifest.prune(input_paths)
+    slices = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    failure = []
+    shard_texts = {}
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                slices.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def produce(writer):
+        try:
+            for file_path in file_paths:
+                if manifest is not None and manifest.is_sliced(file_path, params):
+                    for filename in manifest.slices(file_path):
+                        output_path = os.path.join(output_folder, filename)
+                        # Queue the stored text, or the path for Whisper to load
+                        text = manifest.transcript(output_path, model_key)
+                        put((output_path, None, output_path, text))
+                        if on_sliced:
+                            on_sliced(output_path)
+                    continue
+                if manifest is not None:
+                    manifest.discard_slices(file_path)
+
+                name = os.path.splitext(os.path.basename(file_path))[0]
+                encoder = None
+                shard_writer = None
+                written_names = []
+                for cut, slice_audio in iter_file_slices(file_path, min_length, max_length, planner, streaming):
+                    if stop.is_set():
+                        return
+                    if slice_audio is None:
+                        continue
+                    if encoder is None:
+                        encoder = SliceEncoder.for_segment(slice_audio, output)
+                    output_path = slice_path(output_folder, name, cut.index, output)
+                    if sharded:
+                        if shard_writer is None:
+                            shard_writer = ShardWriter(output_folder, name, output.sample_rate, slice_audio.channels)
+                        written = writer.submit(in_context(_add_to_shard), shard_writer, encoder, slice_audio,
+                                                output_path, cut.index)
+                    else:
+                        written = writer.submit(in_context(encoder.write_segment), slice_audio, output_path)
+                    written_names.append(os.path.basename(output_path))
+                    put((output_path, written, whisper_samples(slice_audio), None))
+                    if on_sliced:
+                        on_sliced(output_path)
+                if shard_writer is not None:
+                    writer.submit(shard_writer.close).result()
+                if manifest is not None:
+                    writer.submit(manifest.record_slices, file_path, params, written_names).result()
+        except Exception as e:
+            failure.append(e)
+        finally:
+            put(_DONE)
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        # Both threads record their stage timings into the caller's collectors
+        producer = threading.Thread(target=in_context(produce), args=(writer,), daemon=True)
+        producer.start()
+        try:
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < batch_size:
+                    item = slices.get()
+                    if item is _DONE:
+                        done = True
+                        break
+                    output_path, _, _, text = item
+                    if text is not None:
+                        yield output_path, text
+                    else:
+                        batch.append(item)
+                if batch:
+                    for output_path, text in _transcribe_slices(model, batch, language):
+                        if manifest is not None:
+                            manifest.record_transcript(output_path, model_key, text)
+                        if sharded:
+                            shard_texts[os.path.basename(output_path)] = text
+                        yield output_path, text
+        finally:
+            stop.set()
+            producer.join()
+            if manifest is not None:
+                manifest.save()
+    if failure:
+        raise failure[0]
+    if shard_texts:
+        ShardReader(output_folder).set_texts(shard_texts)
+
+
+def _add_to_shard(shard_writer, encoder, slice_audio, output_path, index):
+    """Encode a slice and append it to its source's shard."""
+    shard_writer.add(os.path.basename(output_path), encoder.encode(segment_samples(slice_audio)), index)
+
+
+def _transcribe_slices(model, batch, language):
+    """Transcribe a batch of (path, write future, samples, _) and yield (path, text) once each file is written."""
+    texts = transcribe_batch(model, [samples for _, _, samples, _ in batch], batch_size=len(batch), language=language)
+    for (output_path, written, _, _), text in zip(batch, texts):
+        if written is not None:
+            written.result()
+        yield output_path, text
+
+
+def whisper_file_audio(blocks, frame_rate, full_scale):
+    """
+    Convert a file, or a region of one, block by block to the samples Whisper consumes.
+
+    Parameters:
+        blocks (iterable): Frames of shape (frames, channels) in file order.
+        frame_rate (int): Sample rate of the file.
+        full_scale (float): Magnitude of a full-scale sample.
+
+    Returns:
+        numpy.ndarray: Mono 16 kHz float32 samples of the blocks.
+    """
+    return resample_blocks(blocks, frame_rate, full_scale, WHISPER_SAMPLE_RATE)
+
+
+def region_words(model, file_path, cuts, envelope, samples=None, language=None, region_length=SOURCE_REGION_LENGTH):
+    """
+    Transcribe a source file region by region, with word-level timestamps.
+
+    The planned cuts are grouped into regions of about region_length that
+    meet in the widest gaps between slices (see planner.split_regions), and
+    the regions cover the file end to end. Only one region is held as 16 kHz
+    samples at a time, and each is prompted with the text of the one before.
+
+    Parameters:
+        model: Loaded Whisper model.
+        file_path (str): Path to the .wav or .mp3 file.
+        cuts (list): Planned Cut tuples of the file.
+        envelope (SilenceEnvelope): Envelope of the file.
+        samples (numpy.ndarray): The file's samples as file_envelope returns
+            them, or None to decode each region from the file.
+        language (str): Spoken language, or None to detect it per region.
+        region_length (int): Target region length in milliseconds.
+
+    Returns:
+        list: Word tuples in time order, with times in the file.
+    """
+    if not cuts:
+        return []
+    regions = split_regions(cuts, int(region_length * envelope.frames_per_ms))
+    bounds = [0] + [region[0].start_frame for region in regions[1:]] + [envelope.frame_count]
+    words = []
+    prompt = None
+    for start_frame, end_frame in zip(bounds, bounds[1:]):
+        if samples is None:
+            blocks = timed_iter("decode", iter_blocks(file_path, start_frame=start_frame, end_frame=end_frame),
+                                envelope.frame_rate)
+        else:
+            blocks = (samples[i:min(i + BLOCK_FRAMES, end_frame)] for i in range(start_frame, end_frame, BLOCK_FRAMES))
+        with timed("whisper_resample", (end_frame - start_frame) / envelope.frame_rate) as span:
+            audio = whisper_file_audio(blocks, envelope.frame_rate, envelope.max_possible_amplitude)
+            span.exclude = blocks.seconds if samples is None else 0.0
+        offset = int(round(start_frame / envelope.frames_per_ms))
+        found = transcribe_words(model, audio, language, prompt, offset)
+        del audio
+        words.extend(found)
+        prompt = "".join(word.text for word in found).strip() or prompt
+    return words
+
+
+def slice_and_transcribe_sources(input_folder, output_folder, min_length, max_length, model, planner="greedy",
+                                 streaming=False, language=None, snap=False, on_sliced=None, manifest=None,
+                                 model_key=None, output=DEFAULT_OUTPUT, file_paths=None,
+                                 region_length=SOURCE_REGION_LENGTH):
+    """
+    Transcribe each source file once and take every slice's text from it.
+
+    Whisper runs over the file in its native 30 s windows with word
+    timestamps, region by region (see region_words), instead of once per
+    slice with each 3-11 s slice padded to a full window. Every word goes
+    to the slice that holds most of it, so the text of a slice is what is
+    audible in it, decoded with the context of the surrounding speech.
+    With snap, cut points that land inside a word move to the nearer edge
+    of that word first.
+
+    Parameters:
+        input_folder (str): Path to the folder containing input .wav or .mp3 files.
+        output_folder (str): Path to save the slices.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        model: Loaded Whisper model.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+        streaming (bool): Decode inputs block by block, see slicer.slice_file.
+        language (str): Spoken language, or None to detect it per file.
+        snap (bool): Move cut points off words, see alignment.snap_cuts.
+        on_sliced (callable): Called with each slice path once it is written.
+        manifest (Manifest): Reuse the slices and texts of unchanged inputs,
+            see slice_and_transcribe.
+        model_key (str): Identifies the model and settings in the manifest.
+        output (OutputFormat): Container, sample rate and bit depth of the slice files.
+        file_paths (list): Only handle these input files of input_folder,
+            see slicer.slice_audio (default: None, every .wav/.mp3 file in it).
+        region_length (int): Length of the regions transcribed at once, in
+            milliseconds, which bounds the Whisper input held in memory.
+
+    Yields:
+        tuple: (slice_path, text) for each written slice.
+    """
+    sharded = output.format == SHARD_FORMAT
+    if sharded and manifest is not None:
+        raise ValueError("Shard output does not support incremental runs")
+    input_paths = list_input_files(input_folder)
+    file_paths = input_paths if file_paths is None else list(file_paths)
+    params = dict(slice_params(min_length, max_length, planner, output), snap=snap)
+    if manifest is None:
+        clear_output_folder(output_folder)
+    else:
+        os.makedirs(output_folder, exist_ok=True)
+        manifest.prune(input_paths)
+
+    shard_texts = {}
+    for file_path in file_paths:
+        if manifest is not None and manifest.is_sliced(file_path, params):
+            cached = [os.path.join(output_folder, filename) for filename in manifest.slices(file_path)]
+            texts = [manifest.transcript(path, model_key) for path in cached]
+            if None not in texts:
+                yield from zip(cached, texts)
+                continue
+        if manifest is not None:
+            manifest.discard_slices(file_path)
+
+        envelope, samples = file_envelope(file_path, streaming)
+        cuts = plan_file_cuts(file_path, envelope, samples, min_length, max_length, planner)
+        words = region_words(model, file_path, cuts, envelope, samples, language, region_length)
+        if snap:
+            cuts = snap_cuts(cuts, words, envelope, min_length, max_length)
+        texts = assign_words(words, cuts, envelope.frame_rate)
+
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        slices = list(_written_cuts(iter_planned_slices(file_path, cuts, envelope, samples), output_folder, name,
+                                    output, on_sliced))
+        # Shards are complete once the whole file is written, so results follow it
+        written_names = []
+        for cut in slices:
+            output_path = slice_path(output_folder, name, cut.index, output)
+            written_names.append(os.path.basename(output_path))
+            if manifest is not None:
+                manifest.record_transcript(output_path, model_key, texts[cut.index])
+            if sharded:
+                shard_texts[os.path.basename(output_path)] = texts[cut.index]
+            yield output_path, texts[cut.index]
+        if manifest is not None:
+            manifest.record_slices(file_path, params, written_names)
+            manifest.save()
+
+    if shard_texts:
+        ShardReader(output_folder).set_texts(shard_texts)
+
+
+def _written_cuts(slices, output_folder, name, output, on_sliced):
+    """Save (cut, slice) pairs and yield the cuts whose slice was written (not silent)."""
+    for cut, output_path in save_slices(slices, output_folder, name, output):
+        if output_path is not None:
+            if on_sliced:
+                on_sliced(output_path)
+            yield cut
+
+
+def list_slices(folder):
+    """
+    List the slices in a folder, whether written as files or packed in shards.
+
+    Parameters:
+        folder (str): Folder the slices were written to.
+
+    Returns:
+        tuple: (paths, shard_reader). For a shard folder, shard_reader is its
+        ShardReader and each path is the folder joined with a slice name;
+        otherwise shard_reader is None.
+    """
+    if not has_shards(folder):
+        return get_audio_files(folder), None
+    shard_reader = ShardReader(folder)
+    return [os.path.join(folder, name) for name in shard_reader.names()], shard_reader
+
+
+def transcribe_slices(audio_files, load_model, batch_size=16, language=None, shard_reader=None, manifest=None,
+                      model_key=None):
+    """
+    Transcribe written slices batch by batch.
+
+    Parameters:
+        audio_files (list): Slice paths, see list_slices.
+        load_model (callable): Returns the Whisper model. Only called once a
+            batch has a slice without a cached transcript, so a folder that is
+            fully cached never loads the model.
+        batch_size (int): Slices decoded together.
+        language (str): Spoken language, or None to detect it.
+        shard_reader (ShardReader): Reader of a shard folder; the texts are
+            stored in its indexes as each batch finishes.
+        manifest (Manifest): Output folder manifest caching transcripts per
+            model (default: None, transcribe every slice).
+        model_key (str): Identifies the model in the manifest.
+
+    Yields:
+        tuple: (path, text) for every slice, in order.
+    """
+    model = None
+    for start in range(0, len(audio_files), batch_size):
+        batch = audio_files[start:start + batch_size]
+        texts = {}
+        if manifest is not None:
+            for file_path in batch:
+                text = manifest.transcript(file_path, model_key)
+                if text is not None:
+                    texts[file_path] = text
+        pending_files = [file_path for file_path in batch if file_path not in texts]
+        if pending_files:
+            if model is None:
+                model = load_model()
+            clips = pending_files
+            if shard_reader is not None:
+                clips = [whisper_shard_samples(shard_reader, os.path.basename(path)) for path in pending_files]
+            for file_path, text in zip(pending_files, transcribe_batch(model, clips, batch_size=batch_size,
+                                                                       language=language)):
+                texts[file_path] = text
+                if manifest is not None:
+                    manifest.record_transcript(file_path, model_key, text)
+        if shard_reader is not None:
+            shard_reader.set_texts({os.path.basename(path): text for path, text in texts.items()})
+        for file_path in batch:
+            yield file_path, texts[file_path]
@@ -0,0 +1,256 @@
+from collections import deque, namedtuple
+
+import numpy as np
+
+from metrics import timed
+
+# A planned slice: ``index`` names the output file (``<stem>_slice_<index>``),
+# ``start``/``end`` are in milliseconds and ``start_frame``/``end_frame`` are the
+# exact sample frames to write. ``end_frame`` may run past the last frame of the
+# file, in which case the slice is padded with silence.
+Cut = namedtuple("Cut", ["index", "start", "end", "start_frame", "end_frame"])
+
+MIN_SILENCE_LEN = 500  # in milliseconds
+SILENCE_OFFSET = 14  # silence threshold in dB below the file (or slice) loudness
+KEEP_SILENCE = 100  # silence kept on each side of an optimal cut, in milliseconds
+HARD_CUT_COST = 100.0  # cost of cutting through sound when no silence fits
+SHORT_TAIL_COST = 100.0  # cost of ending the file with a slice under min_length
+HARD_CUT_STEP = 100  # finest spacing of hard cut candidates, in milliseconds
+
+
+def plan_greedy(envelope, min_length, max_length):
+    """
+    Plan cuts the way slice_audio always has: walk the file window by window,
+    cutting at the longest silence past min_length and trimming the slice back
+    to its last silence.
+
+    Parameters:
+        envelope (SilenceEnvelope): Envelope of the audio file.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+
+    Returns:
+        list: Cut tuples in file order.
+    """
+    cuts = []
+    silence_thresh = envelope.dbfs() - SILENCE_OFFSET
+    slice_start = 0
+    slice_index = 0
+
+    while slice_start < len(envelope):
+        slice_end = slice_start + max_length
+
+        # Find the quietest point within the max_length window
+        silence = envelope.detect_silence(slice_start, slice_end, MIN_SILENCE_LEN, silence_thresh)
+        best_silence_point = None
+
+        if silence:
+            # Prioritize silences closer to max_length but still valid
+            best_silence_point = max(
+                (s for s in silence if s[0] >= min_length),
+                key=lambda s: (s[1] - s[0], s[0]),
+                default=None
+            )
+
+        if best_silence_point:
+            slice_end = slice_start + best_silence_point[0]
+        else:
+            # If no good silence found, use max_length as fallback
+            slice_end = min(slice_start + max_length, len(envelope))
+
+        # Ensure slice_end does not cut through speech
+        start, end, first_frame, frames = envelope.span(slice_start, slice_end)
+        silence_in_slice = envelope.detect_silence(
+            slice_start, slice_end, MIN_SILENCE_LEN,
+            envelope.dbfs(slice_start, slice_end) - SILENCE_OFFSET
+        )
+        if silence_in_slice:
+            last_silence_start = silence_in_slice[-1][0]
+            if last_silence_start > min_length:
+                end = start + last_silence_start
+                frames = int(last_silence_start * envelope.frames_per_ms)
+
+        cuts.append(Cut(slice_index, start, end, first_frame, first_frame + frames))
+        slice_index += 1
+        slice_start = slice_end + 50  # Adjust for slight overlap to avoid premature slicing
+
+    return cuts
+
+
+def plan_optimal(envelope, min_length, max_length, keep_silence=KEEP_SILENCE, silences=None):
+    """
+    Plan all cuts of a file at once.
+
+    The whole file is searched for silences in one pass, then dynamic
+    programming picks the set of silences to cut at so that every slice lasts
+    between min_length and max_length (only the final slice may be shorter)
+    and cuts fall in the longest silences. Each cut costs
+    ``MIN_SILENCE_LEN / silence length``, so a few long pauses beat many short
+    ones. Where speech runs longer than max_length without a usable silence,
+    hard cuts on a regular grid keep the plan feasible at a high cost.
+
+    Parameters:
+        envelope (SilenceEnvelope): Envelope of the audio file.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        keep_silence (int): Silence kept at each side of a cut in milliseconds.
+        silences (list): (start, end) pauses in milliseconds to cut at,
+            e.g. from vad.detect_pauses (default: None, detect silences
+            from the envelope's loudness).
+
+    Returns:
+        list: Cut tuples in file order.
+
+    Raises:
+        ValueError: If no plan keeps the slices within the bounds, i.e.
+            max_length is below min_length.
+    """
+    length = len(envelope)
+    if silences is None:
+        silences = envelope.detect_silence(0, length, MIN_SILENCE_LEN, envelope.dbfs() - SILENCE_OFFSET)
+
+    # Candidate cut points: (slice end before the cut, slice start after it, cost)
+    candidates = [(0, 0, 0.0)]
+    for silence_start, silence_end in silences:
+        keep = min(keep_silence, (silence_end - silence_start) // 2)
+        candidates.append((silence_start + keep, silence_end - keep,
+                           MIN_SILENCE_LEN / (silence_end - silence_start)))
+    # A grid no coarser than max_length - min_length leaves a hard cut within
+    # reach of every candidate. Too fine a grid would make the search slow, so
+    # below HARD_CUT_STEP it falls back to slices of exactly min_length.
+    step = max_length - min_length
+    if step < HARD_CUT_STEP:
+        step = max(min_length, 1)
+    hard_cuts = np.arange(step, length, step)
+    hard_costs = np.full(len(hard_cuts), HARD_CUT_COST)
+    if silences:
+        # Grid points inside a silence are kept, at the cost of that silence,
+        # since the silence candidate itself may be out of reach.
+        bounds = np.array(silences)
+        inside = np.searchsorted(bounds[:, 0], hard_cuts, side="right") - 1
+        quiet = (inside >= 0) & (hard_cuts <= bounds[np.maximum(inside, 0), 1])
+        hard_costs[quiet] = MIN_SILENCE_LEN / np.maximum(np.diff(bounds[inside[quiet]], axis=1)[:, 0], 1)
+    candidates.extend((int(t), int(t), float(c)) for t, c in zip(hard_cuts, hard_costs))
+    candidates.sort()
+    candidates.append((length, length, 0.0))
+
+    before = np.array([c[0] for c in candidates])
+    after = np.array([c[1] for c in candidates])
+    cost = np.array([c[2] for c in candidates])
+    best = np.full(len(candidates), np.inf)
+    previous = np.full(len(candidates), -1)
+    best[0] = 0.0
+
+    # Candidates are sorted, so taken in order of ``after`` the predecessors
+    # that keep a slice within [min_length, max_length] form a sliding window:
+    # keep a monotonic deque of its cheapest entries for an O(n) pass. (Grid
+    # points inside a silence make ``after`` unsorted in candidate order.)
+    order = np.argsort(after[:-1], kind="stable")
+    window = deque()
+    entering = 0
+    for j in range(1, len(candidates) - 1):
+        while entering < len(order) and after[order[entering]] <= before[j] - min_length:
+            i = order[entering]
+            while window and best[window[-1]] >= best[i]:
+                window.pop()
+            window.append(i)
+            entering += 1
+        while window and after[window[0]] < before[j] - max_length:
+            window.popleft()
+        if window and np.isfinite(best[window[0]]):
+            best[j] = best[window[0]] + cost[j]
+            previous[j] = window[0]
+
+    # The last slice ends with the file and may be shorter than min_length.
+    end = len(candidates) - 1
+    reachable = np.flatnonzero(after[:end] >= length - max_length)
+    if len(reachable):
+        tail = best[reachable] + np.where(length - after[reachable] < min_length, SHORT_TAIL_COST, 0.0)
+        previous[end] = reachable[np.argmin(tail)]
+        best[end] = tail.min()
+    if not np.isfinite(best[end]):
+        # Only when max_length is below min_length can no plan fit
+        raise ValueError(f"No cuts keep slices between {min_length} and {max_length} ms")
+
+    chosen = [end]
+    while chosen[-1] > 0:
+        chosen.append(previous[chosen[-1]])
+    chosen.reverse()
+
+    cuts = []
+    for index, (i, j) in enumerate(zip(chosen, chosen[1:])):
+        start, end = int(after[i]), int(before[j])
+        start, end, first_frame, frames = envelope.span(start, end)
+        cuts.append(Cut(index, start, end, first_frame, first_frame + frames))
+    return cuts
+
+
+def split_regions(cuts, region_frames):
+    """
+    Group consecutive cuts into independent regions of roughly region_frames.
+
+    Each region is closed at the widest gap between two cuts found while its
+    length is within 25% of region_frames, so regions meet in the strongest
+    silences. Regions keep the cuts' global indices.
+
+    Parameters:
+        cuts (list): Cut tuples in file order.
+        region_frames (int): Target region length in frames.
+
+    Returns:
+        list: Lists of Cut tuples, one per region, in file order.
+    """
+    regions = []
+    start = 0
+    i = 0
+    best = None  # (gap, index of the last cut before it)
+    while i < len(cuts) - 1:
+        span = cuts[i].end_frame - cuts[start].start_frame
+        if span >= region_frames * 3 // 4:
+            gap = cuts[i + 1].start_frame - cuts[i].end_frame
+            if best is None or gap > best[0]:
+                best = (gap, i)
+            if span >= region_frames * 5 // 4:
+                regions.append(cuts[start:best[1] + 1])
+                start = i = best[1] + 1
+                best = None
+                continue
+        i += 1
+    if start < len(cuts):
+        regions.append(cuts[start:])
+    return regions
+
+
+VAD_PLANNER = "vad"
+PLANNERS = {
+    "greedy": plan_greedy,
+    "optimal": plan_optimal,
+    VAD_PLANNER: plan_optimal,  # with the pauses from vad.py instead of loudness
+}
+
+
+def plan_cuts(envelope, min_length, max_length, planner="greedy", silences=None):
+    """
+    Plan where to cut one audio file, without touching any audio data.
+
+    Parameters:
+        envelope (SilenceEnvelope): Envelope of the audio file.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): "greedy" (the original window-by-window search),
+            "optimal" (whole-file dynamic programming) or "vad" (the optimal
+            search over the pauses a voice activity detector found).
+        silences (list): For the "vad" planner, the (start, end) pauses in
+            milliseconds, see vad.detect_pauses.
+
+    Returns:
+        list: Cut tuples in file order.
+    """
+    if planner not in PLANNERS:
+        raise ValueError(f"Unknown planner: {planner}")
+    if planner == VAD_PLANNER and silences is None:
+        raise ValueError("The vad planner needs the pauses found by vad.detect_pauses")
+    with timed("plan", len(envelope) / 1000):
+        if planner == VAD_PLANNER:
+            return plan_optimal(envelope, min_length, max_length, silences=silences)
+        return PLANNERS[planner](envelope, min_length, max_length)
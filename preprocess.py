@@ -0,0 +1,382 @@
+"""
+Optional cleanup of the source audio before it is sliced.
+
+Background noise and music beds throw off both the dBFS cut points and the
+transcripts. Two methods are available:
+
+- "denoise": spectral gating with noisereduce (non-stationary noise).
+- "vocals": vocal separation with Demucs (the model audio-separator wraps),
+  keeping only the vocals stem.
+
+Files are cleaned in overlapping chunks of CHUNK_SECONDS, on a process pool
+when workers > 1, and the chunks are joined with a linear crossfade over
+their OVERLAP_SECONDS so no seam is audible or shows up as a cut point. The
+cleaned audio is cached under the cache folder by input content hash and
+settings, so re-slicing with other lengths or planners never repeats the
+expensive pass; the cache can be deleted at any time.
+
+The slicer reads the cleaned files through a "view" folder of hard links
+named after the input files (a.mp3 is a.wav), so manifests and
+incremental runs work as they do on the original folder. Each run builds a
+view of its own, so concurrent jobs over the same inputs do not touch each
+other's files; remove_view deletes it once the run is done.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from decoder import duration, iter_blocks, probe
+from manifest import file_hash
+from metrics import timed
+from slicer import list_input_files
+
+PREPROCESSORS = ("denoise", "vocals")
+CACHE_FOLDER = os.path.join(os.path.expanduser("~"), ".cache", "audioslicer", "preprocess")
+PREPROCESS_VERSION = 1  # bump when a method's output changes, so cached files are not reused
+CHUNK_SECONDS = 30  # audio cleaned per task
+OVERLAP_SECONDS = 1  # shared by neighbouring chunks and crossfaded
+DENOISE_DECREASE = 1.0  # noisereduce prop_decrease: 1.0 removes all of the estimated noise
+SEPARATION_MODEL = "htdemucs"  # Demucs model for "vocals"
+INDEX_NAME = "inputs.json"  # content hashes of the inputs, reused while size and mtime are unchanged
+# The cleaned files are written as PCM the slicer can memory-map
+OUTPUT_SUBTYPES = {1: "PCM_16", 2: "PCM_16"}  # other sample widths are written as PCM_32
+
+_index_lock = threading.Lock()
+_models = {}
+_threads = None
+
+
+def preprocess_settings(method):
+    """Return the settings that determine the cleaned audio, as part of its cache key."""
+    if method not in PREPROCESSORS:
+        raise ValueError(f"Unknown preprocessing method: {method}")
+    settings = {"method": method, "version": PREPROCESS_VERSION, "chunk": CHUNK_SECONDS, "overlap": OVERLAP_SECONDS}
+    if method == "denoise":
+        settings["prop_decrease"] = DENOISE_DECREASE
+    else:
+        settings["model"] = SEPARATION_MODEL
+    return settings
+
+
+def _digest(value):
+    return hashlib.blake2b(json.dumps(value, sort_keys=True).encode("utf-8"), digest_size=10).hexdigest()
+
+
+def input_hash(file_path, cache_folder):
+    """Return the content hash of an input, reusing the one in the cache index while size and mtime are unchanged."""
+    index_path = os.path.join(cache_folder, INDEX_NAME)
+    key = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    with _index_lock:
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as file:
+                index = json.load(file)
+        entry = index.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["hash"]
+        index[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": file_hash(file_path)}
+        os.makedirs(cache_folder, exist_ok=True)
+        # Other processes (a CLI run next to the server) may write the index at the same time
+        fd, temp_path = tempfile.mkstemp(dir=cache_folder, prefix=INDEX_NAME, suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as file:
+                json.dump(index, file)
+            os.replace(temp_path, index_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return index[key]["hash"]
+
+
+def iter_chunks(blocks, chunk_frames, overlap_frames):
+    """
+    Regroup decoded blocks into chunks that overlap their predecessor.
+
+    Parameters:
+        blocks (iterable): Frames of shape (frames, channels) in file order.
+        chunk_frames (int): Length of each chunk but the last.
+        overlap_frames (int): Frames each chunk shares with the one before it.
+
+    Yields:
+        numpy.ndarray: Chunk i holds the frames from i * (chunk_frames - overlap_frames) on.
+    """
+    buffer = []
+    buffered = 0
+    emitted = False
+    for block in blocks:
+        buffer.append(block)
+        buffered += len(block)
+        while buffered >= chunk_frames:
+            data = np.concatenate(buffer)
+            yield data[:chunk_frames]
+            emitted = True
+            buffer = [data[chunk_frames - overlap_frames:]]
+            buffered = len(buffer[0])
+    # Once a chunk is out, a remainder within its overlap holds nothing new
+    if buffered > (overlap_frames if emitted else 0):
+        yield np.concatenate(buffer)
+
+
+def crossfade(chunks, overlap_frames):
+    """
+    Join processed chunks back into one stream.
+
+    Parameters:
+        chunks (iterable): Processed chunks in order, laid out as iter_chunks made them.
+        overlap_frames (int): Frames each chunk shares with the one before it.
+
+    Yields:
+        numpy.ndarray: Consecutive pieces of the joined audio.
+    """
+    tail = None
+    for chunk in chunks:
+        if tail is not None:
+            fade = np.linspace(0.0, 1.0, len(tail) + 2, dtype=np.float32)[1:-1, None]
+            yield tail * (1 - fade) + chunk[:len(tail)] * fade
+            chunk = chunk[len(tail):]
+        tail = chunk[max(len(chunk) - overlap_frames, 0):]
+        yield chunk[:len(chunk) - len(tail)]
+    if tail is not None:
+        yield tail
+
+
+def _init_worker(threads):
+    """Process pool initializer: share the cores between the workers' torch threads."""
+    global _threads
+    _threads = threads
+
+
+def _separator():
+    if SEPARATION_MODEL not in _models:
+        import torch
+        from demucs.pretrained import get_model
+
+        if _threads:
+            torch.set_num_threads(_threads)
+        model = get_model(SEPARATION_MODEL)
+        model.eval()
+        _models[SEPARATION_MODEL] = model
+    return _models[SEPARATION_MODEL]
+
+
+def _denoise(samples, frame_rate):
+    import noisereduce
+
+    cleaned = noisereduce.reduce_noise(y=samples.T, sr=frame_rate, prop_decrease=DENOISE_DECREASE, n_jobs=1)
+    return np.asarray(cleaned, np.float32).reshape(samples.shape[1], -1).T
+
+
+def _separate_vocals(samples, frame_rate):
+    import torch
+    from demucs.apply import apply_model
+
+    model = _separator()
+    channels = samples.shape[1]
+    audio = samples if channels == model.audio_channels else np.repeat(
+        samples.mean(axis=1, keepdims=True), model.audio_channels, axis=1)
+    if frame_rate != model.samplerate:
+        audio = soxr.resample(audio, frame_rate, model.samplerate)
+    mix = torch.from_numpy(np.ascontiguousarray(audio.T, np.float32))
+    # Demucs expects normalized input, as its own separate command does
+    reference = mix.mean(0)
+    mean, std = reference.mean(), reference.std() + 1e-8
+    with torch.no_grad():
+        sources = apply_model(model, ((mix - mean) / std)[None], shifts=0, split=True, overlap=0.25,
+                              progress=False, device="cpu")[0]
+    vocals = (sources[model.sources.index("vocals")] * std + mean).numpy().T
+    if channels != model.audio_channels:
+        vocals = np.repeat(vocals.mean(axis=1, keepdims=True), channels, axis=1)
+    if frame_rate != model.samplerate:
+        vocals = soxr.resample(vocals, model.samplerate, frame_rate)
+    return vocals
+
+
+def clean_chunk(method, samples, frame_rate):
+    """
+    Clean one chunk.
+
+    Parameters:
+        method (str): One of PREPROCESSORS.
+        samples (numpy.ndarray): float32 frames of shape (frames, channels).
+        frame_rate (int): Sample rate.
+
+    Returns:
+        numpy.ndarray: The cleaned float32 frames, of the same shape.
+    """
+    cleaned = _denoise(samples, frame_rate) if method == "denoise" else _separate_vocals(samples, frame_rate)
+    # Resampling can be a frame off; the crossfade needs the exact length
+    cleaned = cleaned[:len(samples)]
+    if len(cleaned) < len(samples):
+        cleaned = np.pad(cleaned, ((0, len(samples) - len(cleaned)), (0, 0)))
+    return cleaned.astype(np.float32, copy=False)
+
+
+def _cleaned_chunks(method, chunks, frame_rate, full_scale, executor, max_pending):
+    """Clean chunks in order, with at most max_pending of them queued on the executor."""
+    pending = deque()
+    for chunk in chunks:
+        samples = chunk.astype(np.float32) / full_scale
+        if executor is None:
+            yield clean_chunk(method, samples, frame_rate)
+            continue
+        pending.append(executor.submit(clean_chunk, method, samples, frame_rate))
+        while len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def clean_file(file_path, cache_folder, method, executor=None, workers=1, on_progress=None):
+    """
+    Return the cleaned copy of one input, cleaning it unless it is cached.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        cache_folder (str): Folder the cleaned files are kept in.
+        method (str): One of PREPROCESSORS.
+        executor (Executor): Pool to clean the chunks on (default: None, in this process).
+        workers (int): Number of workers of the executor.
+        on_progress (callable): Called with (file_path, chunks done, total chunks).
+
+    Returns:
+        str: Path of the cleaned WAV file in the cache.
+    """
+    settings = preprocess_settings(method)
+    cached = os.path.join(cache_folder, _digest(settings), f"{input_hash(file_path, cache_folder)}.wav")
+    if os.path.exists(cached):
+        return cached
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+
+    frame_rate, channels, sample_width = probe(file_path)
+    full_scale = float(1 << (8 * sample_width - 1))
+    chunk_frames = CHUNK_SECONDS * frame_rate
+    overlap_frames = OVERLAP_SECONDS * frame_rate
+    seconds = duration(file_path) / 1000
+    total = max(1, -(-int(seconds * frame_rate - overlap_frames) // (chunk_frames - overlap_frames)))
+    chunks = iter_chunks(iter_blocks(file_path), chunk_frames, overlap_frames)
+    cleaned = _cleaned_chunks(method, chunks, frame_rate, full_scale, executor, 2 * workers)
+
+    # A job cleaning the same input concurrently writes its own temporary file; the last one in place wins
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cached), suffix=".tmp")
+    os.close(fd)
+    try:
+        with timed("preprocess", seconds):
+            with sf.SoundFile(temp_path, "w", frame_rate, channels, OUTPUT_SUBTYPES.get(sample_width, "PCM_32"),
+                              format="WAV") as output:
+                for piece in crossfade(_counted(cleaned, file_path, total, on_progress), overlap_frames):
+                    output.write(np.clip(piece, -1.0, 1.0))
+        os.replace(temp_path, cached)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return cached
+
+
+def _counted(chunks, file_path, total, on_progress):
+    for done, chunk in enumerate(chunks, 1):
+        if on_progress:
+            on_progress(file_path, min(done, total), total)
+        yield chunk
+
+
+def _view_names(file_paths):
+    """
+    Names of the inputs' cleaned files in a view.
+
+    Each file is named <stem>.wav, so its slices are named as they would be
+    without preprocessing. Inputs that share a stem (a.wav and a.mp3) keep
+    their extension in it instead (a_wav.wav, a_mp3.wav) so they stay apart.
+
+    Parameters:
+        file_paths (list): Paths of the input files.
+
+    Returns:
+        list: File names, in the order of file_paths.
+    """
+    stems = [os.path.splitext(os.path.basename(file_path)) for file_path in file_paths]
+    counts = Counter(stem for stem, _ in stems)
+    taken = {stem for stem, count in counts.items() if count == 1}
+    names = []
+    for stem, extension in stems:
+        if counts[stem] > 1:
+            name = base = f"{stem}_{extension.lstrip('.')}"
+            suffix = 1
+            while name in taken:
+                name = f"{base}_{suffix}"
+                suffix += 1
+            taken.add(name)
+            stem = name
+        names.append(stem + ".wav")
+    return names
+
+
+def _link(source, link_path):
+    """Point link_path at source: a hard link, or a copy where the file system has none."""
+    try:
+        os.link(source, link_path)
+    except OSError:
+        shutil.copyfile(source, link_path)
+
+
+def preprocess_folder(input_folder, cache_folder, method, workers=1, file_paths=None, on_progress=None):
+    """
+    Clean the audio files of a folder before slicing.
+
+    Parameters:
+        input_folder (str): Folder with the source .wav and .mp3 files.
+        cache_folder (str): Folder the cleaned files (and views) are kept in.
+        method (str): One of PREPROCESSORS.
+        workers (int): Processes cleaning chunks in parallel (default: 1, in
+            this process).
+        file_paths (list): Only clean these files of input_folder (default:
+            None, every .wav/.mp3 file in it).
+        on_progress (callable): Called with (file_path, chunks done, total
+            chunks) as a file is cleaned; it may raise to stop.
+
+    Returns:
+        tuple: (view_folder, view_paths): the folder to slice instead of
+        input_folder, new for this call and holding the cleaned copies of
+        file_paths only, and those files in order. Pass view_folder to
+        remove_view when done.
+    """
+    preprocess_settings(method)  # fails on an unknown method before anything is created
+    file_paths = list_input_files(input_folder) if file_paths is None else list(file_paths)
+    views = os.path.join(cache_folder, "views")
+    os.makedirs(views, exist_ok=True)
+    view_folder = tempfile.mkdtemp(dir=views)
+
+    executor = None
+    if workers and workers > 1:
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(max(1, (os.cpu_count() or 1) // workers),))
+    view_paths = []
+    try:
+        for file_path, view_name in zip(file_paths, _view_names(file_paths)):
+            view_path = os.path.join(view_folder, view_name)
+            _link(clean_file(file_path, cache_folder, method, executor, workers, on_progress), view_path)
+            view_paths.append(view_path)
+    except BaseException:
+        remove_view(view_folder)
+        raise
+    finally:
+        if executor is not None:
+            # On an error (or a cancelled job) the queued chunks are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
+    return view_folder, view_paths
+
+
+def remove_view(view_folder):
+    """Delete a view folder preprocess_folder made; the cleaned files stay in the cache."""
+    shutil.rmtree(view_folder, ignore_errors=True)
@@ -0,0 +1,191 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from metrics import timed
+
+SHARD_FORMAT = "shard"
+SHARD_VERSION = 1
+SHARD_BYTES = 1 << 30  # a shard is closed once its data reaches this size
+SHARD_DTYPE = np.int16
+
+
+def shard_name(name, first_index):
+    """Return the file stem of the shard of source `name` whose first slice is `first_index`."""
+    return f"{name}_shard_{first_index}"
+
+
+def has_shards(folder):
+    """Whether folder holds sliced audio in shard form."""
+    return bool(glob.glob(os.path.join(glob.escape(folder), "*_shard_*.json")))
+
+
+def _shard_order(index_path):
+    """Sort key putting shards in source order, then slice order."""
+    name, first_index = os.path.splitext(os.path.basename(index_path))[0].rsplit("_shard_", 1)
+    return name, int(first_index)
+
+
+def _write_json(path, data):
+    """Write a JSON file, replacing the previous copy atomically."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
+
+
+class ShardWriter:
+    """
+    Append the slices of one source file to large shard files.
+
+    Each shard is a raw, contiguous int16 array of interleaved frames
+    (`<stem>.pcm`) plus a JSON index (`<stem>.json`) giving every slice's
+    name, frame offset, frame count and transcript. Training jobs open a few
+    large files instead of tens of thousands of WAVs, and ShardReader maps
+    them into memory. A shard is closed and a new one started once it holds
+    max_bytes of audio; the index is written when the shard is closed, so a
+    shard without an index is incomplete.
+    """
+
+    def __init__(self, output_folder, name, sample_rate, channels, max_bytes=SHARD_BYTES):
+        """
+        Parameters:
+            output_folder (str): Folder the shards are written to.
+            name (str): Shard file prefix, usually the source file stem.
+            sample_rate (int): Sample rate of the slices.
+            channels (int): Channel count of the slices.
+            max_bytes (int): Data size at which a shard is closed.
+        """
+        self.output_folder = output_folder
+        self.name = name
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_bytes = max_bytes
+        self._file = None
+        self._stem = None
+        self._slices = []
+        self._frames = 0
+
+    def add(self, slice_name, samples, first_index=0):
+        """
+        Append one slice.
+
+        Parameters:
+            slice_name (str): Name the slice is looked up by.
+            samples (numpy.ndarray): int16 frames of shape (frames, channels).
+            first_index (int): Cut index of the slice, used to name a new shard.
+        """
+        with timed("export", len(samples) / self.sample_rate):
+            if self._file is None:
+                self._stem = shard_name(self.name, first_index)
+                self._file = open(os.path.join(self.output_folder, self._stem + ".pcm"), "wb")
+            samples = np.ascontiguousarray(samples, dtype=SHARD_DTYPE)
+            self._file.write(samples.tobytes())
+        self._slices.append({"name": slice_name, "offset": self._frames, "frames": len(samples), "text": None})
+        self._frames += len(samples)
+        if self._frames * self.channels * SHARD_DTYPE().itemsize >= self.max_bytes:
+            self._close_shard()
+
+    def _close_shard(self):
+        self._file.close()
+        _write_json(os.path.join(self.output_folder, self._stem + ".json"), {
+            "version": SHARD_VERSION,
+            "data": self._stem + ".pcm",
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "dtype": np.dtype(SHARD_DTYPE).name,
+            "slices": self._slices,
+        })
+        self._file = None
+        self._slices = []
+        self._frames = 0
+
+    def close(self):
+        """Close the current shard and write its index."""
+        if self._file is not None:
+            self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class ShardReader:
+    """
+    Random access to the slices of a shard folder.
+
+    Shard data is memory-mapped, so audio() returns a read-only view into the
+    page cache without copying; only the pages of the slices actually read
+    are loaded.
+    """
+
+    def __init__(self, folder):
+        """
+        Parameters:
+            folder (str): Folder holding the shard files.
+        """
+        self.folder = folder
+        self._indexes = {}
+        self._data = {}
+        self._slices = {}
+        for index_path in sorted(glob.glob(os.path.join(glob.escape(folder), "*_shard_*.json")), key=_shard_order):
+            with open(index_path, encoding="utf-8") as file:
+                index = json.load(file)
+            self._indexes[index_path] = index
+            for entry in index["slices"]:
+                self._slices[entry["name"]] = (index_path, entry)
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, slice_name):
+        return slice_name in self._slices
+
+    def names(self):
+        """Return the slice names, grouped by shard in file order."""
+        return list(self._slices)
+
+    def _shard_data(self, index_path):
+        if index_path not in self._data:
+            index = self._indexes[index_path]
+            data = np.memmap(os.path.join(self.folder, index["data"]), dtype=index["dtype"], mode="r")
+            self._data[index_path] = data.reshape(-1, index["channels"])
+        return self._data[index_path]
+
+    def audio(self, slice_name):
+        """
+        Return the samples of a slice.
+
+        Parameters:
+            slice_name (str): The slice to read.
+
+        Returns:
+            tuple: (samples, sample_rate) where samples is a read-only int16
+            view of shape (frames, channels).
+        """
+        index_path, entry = self._slices[slice_name]
+        data = self._shard_data(index_path)
+        return data[entry["offset"]:entry["offset"] + entry["frames"]], self._indexes[index_path]["sample_rate"]
+
+    def text(self, slice_name):
+        """Return the transcript stored for a slice, or None."""
+        return self._slices[slice_name][1]["text"]
+
+    def set_texts(self, texts):
+        """
+        Store transcripts in the shard indexes.
+
+        Parameters:
+            texts (dict): Slice name -> transcript.
+        """
+        changed = set()
+        for slice_name, text in texts.items():
+            index_path, entry = self._slices[slice_name]
+            entry["text"] = text
+            changed.add(index_path)
+        for index_path in changed:
+            _write_json(index_path, self._indexes[index_path])
@@ -0,0 +1,268 @@
+import math
+import numpy as np
+
+# NumPy dtypes matching pydub's in-memory sample layout (8-bit is stored signed,
+# 24-bit is widened to 32-bit on load).
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+BLOCK_FRAMES = 1 << 20
+
+
+def segment_samples(audio_segment):
+    """
+    Return the samples of an AudioSegment as a (frames, channels) NumPy view.
+
+    Parameters:
+        audio_segment (AudioSegment): The audio segment to view.
+
+    Returns:
+        numpy.ndarray: Read-only view on the segment's raw data (no copy).
+    """
+    if audio_segment.sample_width not in SAMPLE_DTYPES:
+        raise ValueError(f"Unsupported sample width: {audio_segment.sample_width}")
+    samples = np.frombuffer(audio_segment.raw_data, dtype=SAMPLE_DTYPES[audio_segment.sample_width])
+    return samples.reshape(-1, audio_segment.channels)
+
+
+def _first_ms_at(frame, frames_per_ms):
+    """Smallest millisecond whose pydub frame position is at or after ``frame``."""
+    ms = max(int(frame / frames_per_ms) - 1, 0)
+    while int(ms * frames_per_ms) < frame:
+        ms += 1
+    return ms
+
+
+class SilenceEnvelope:
+    """
+    Cumulative signal energy of one audio file, sampled on pydub's 1 ms grid.
+
+    The envelope is computed once per file. Every RMS/dBFS question that pydub
+    would answer by re-reading ``audio[start:end]`` (including the windows
+    ``detect_silence`` walks over) becomes a pair of prefix-sum lookups, using
+    the same millisecond-to-frame arithmetic as pydub so the results match
+    ``pydub.silence.detect_silence`` exactly.
+
+    Besides the energy before each grid frame, the energy of the frames on
+    either side of it is kept, because pydub positions inside a slice
+    (``int(start * rate) + int(offset * rate)``) can land one frame away from
+    the grid position ``int((start + offset) * rate)``.
+    """
+
+    def __init__(self, cumulative, before, at, total, frame_count, frame_rate, channels, sample_width):
+        self._cumulative = cumulative
+        self._total = total
+        self._before = before
+        self._at = at
+        self.frame_count = frame_count
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frames_per_ms = frame_rate / 1000.0
+        self.max_possible_amplitude = (2 ** (sample_width * 8)) / 2
+        self._length = round(1000 * (float(frame_count) / frame_rate))
+
+    @classmethod
+    def from_segment(cls, audio_segment):
+        """
+        Build the envelope of an in-memory AudioSegment.
+
+        Parameters:
+            audio_segment (AudioSegment): The decoded audio file.
+
+        Returns:
+            SilenceEnvelope: The envelope of the whole segment.
+        """
+        return cls.from_samples(segment_samples(audio_segment), audio_segment.frame_rate, audio_segment.sample_width)
+
+    @classmethod
+    def from_samples(cls, samples, frame_rate, sample_width):
+        """
+        Build the envelope of samples already in memory or memory-mapped.
+
+        Parameters:
+            samples (numpy.ndarray): Frames of shape (frames, channels) in pydub's layout.
+            frame_rate (int): Sample rate of the audio.
+            sample_width (int): Bytes per sample.
+
+        Returns:
+            SilenceEnvelope: The envelope of all the samples.
+        """
+        blocks = (samples[i:i + BLOCK_FRAMES] for i in range(0, len(samples), BLOCK_FRAMES))
+        return cls.from_blocks(blocks, frame_rate, samples.shape[1], sample_width)
+
+    @classmethod
+    def from_blocks(cls, blocks, frame_rate, channels, sample_width):
+        """
+        Build the envelope from consecutive blocks of samples.
+
+        Parameters:
+            blocks (iterable): NumPy arrays of shape (frames, channels) in file order.
+            frame_rate (int): Sample rate of the audio.
+            channels (int): Number of channels.
+            sample_width (int): Bytes per sample (1, 2 or 4).
+
+        Returns:
+            SilenceEnvelope: The envelope of the concatenated blocks.
+        """
+        # 16-bit squares summed over hours of audio still fit in int64; wider
+        # samples would overflow, so accumulate those in float64 like audioop.
+        dtype = np.int64 if sample_width <= 2 else np.float64
+        frames_per_ms = frame_rate / 1000.0
+        cumulative, before, at = [], [], []
+        total = dtype(0)
+        frame = 0
+        next_ms = 0
+        prev_energy = dtype(0)
+
+        for block in blocks:
+            block = np.asarray(block).reshape(-1, channels).astype(dtype)
+            energy = np.einsum("ij,ij->i", block, block)
+            if not len(energy):
+                continue
+            end = frame + len(energy)
+            end_ms = _first_ms_at(end, frames_per_ms)
+            ms = np.arange(next_ms, end_ms)
+            offsets = np.floor(ms * frames_per_ms).astype(np.int64) - frame
+            running = np.concatenate(([0], np.cumsum(energy)))
+
+            cumulative.append(total + running[offsets])
+            at.append(energy[offsets])
+            before.append(np.where(offsets > 0, energy[np.maximum(offsets - 1, 0)], prev_energy))
+
+            total = total + running[-1]
+            prev_energy = energy[-1]
+            frame = end
+            next_ms = end_ms
+
+        # Grid points at or past the last frame read zero padding, as pydub does.
+        length = round(1000 * (float(frame) / frame_rate))
+        ms = np.arange(next_ms, max(length + 3, next_ms))
+        grid = np.floor(ms * frames_per_ms).astype(np.int64)
+        cumulative.append(np.full(len(ms), total, dtype=dtype))
+        at.append(np.zeros(len(ms), dtype=dtype))
+        before.append(np.where(grid == frame, prev_energy, 0).astype(dtype))
+
+        return cls(
+            np.concatenate(cumulative).astype(dtype),
+            np.concatenate(before).astype(dtype),
+            np.concatenate(at).astype(dtype),
+            total, frame, frame_rate, channels, sample_width,
+        )
+
+    def __len__(self):
+        """Length of the audio in milliseconds, as ``len(AudioSegment)``."""
+        return self._length
+
+    def _prefix(self, frames, ms):
+        """
+        Energy of all frames before ``frames``.
+
+        ``ms`` is the millisecond each frame position was derived from; the
+        frame must lie within one frame of that millisecond's grid position.
+        """
+        ms = np.minimum(ms, len(self._cumulative) - 1)
+        frames = np.minimum(frames, self.frame_count)
+        grid = np.minimum(np.floor(ms * self.frames_per_ms).astype(np.int64), self.frame_count)
+        delta = frames - grid
+        return (self._cumulative[ms]
+                + np.where(delta > 0, self._at[ms], 0)
+                - np.where(delta < 0, self._before[ms], 0))
+
+    def span(self, start, end):
+        """
+        Frames pydub reads for ``audio[start:end]``.
+
+        Parameters:
+            start (int): Start of the range in milliseconds.
+            end (int): End of the range in milliseconds.
+
+        Returns:
+            tuple: (clamped start ms, clamped end ms, first frame, total frames).
+            Frames past the end of the file are zero padding.
+        """
+        start = min(start, len(self))
+        end = min(end, len(self))
+        first = int(start * self.frames_per_ms)
+        last = int(end * self.frames_per_ms)
+        real = min(last, self.frame_count) - first
+        return start, end, first, last - first if real > 0 else 0
+
+    def _rms(self, energy, frames):
+        """audioop.rms over ``frames`` frames holding ``energy`` in total."""
+        samples = np.asarray(frames, dtype=np.float64) * self.channels
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rms = np.floor(np.sqrt(np.asarray(energy, dtype=np.float64) / samples))
+        return np.where(samples > 0, rms, 0)
+
+    def _window_rms(self, offsets, start, end, first, total, length):
+        """RMS of the ``length`` ms windows at ``offsets`` inside ``audio[start:end]``."""
+        lo = np.floor(offsets * self.frames_per_ms).astype(np.int64)
+        hi = np.floor((offsets + length) * self.frames_per_ms).astype(np.int64)
+        available = np.minimum(hi, total)
+        frames = np.where(available > lo, hi - lo, 0)
+        energy = (self._prefix(first + available, np.where(hi < total, start + offsets + length, end))
+                  - self._prefix(first + lo, start + offsets))
+        return self._rms(energy, frames)
+
+    def dbfs(self, start=0, end=None):
+        """
+        Loudness of ``audio[start:end]`` in dBFS.
+
+        Parameters:
+            start (int): Start of the range in milliseconds.
+            end (int): End of the range in milliseconds (default: the whole file,
+                as ``audio.dBFS``).
+
+        Returns:
+            float: Same value as ``audio[start:end].dBFS``.
+        """
+        if end is None and not start:
+            energy, total = self._total, self.frame_count
+        else:
+            start, end, first, total = self.span(start, len(self) if end is None else end)
+            energy = self._prefix(first + total, end) - self._prefix(first, start)
+        rms = float(self._rms(energy, total))
+        if not rms:
+            return -float("infinity")
+        return 20 * math.log10(rms / self.max_possible_amplitude)
+
+    def detect_silence(self, start, end, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+        """
+        Find silent sections within ``audio[start:end]``.
+
+        Parameters:
+            start (int): Start of the searched range in milliseconds.
+            end (int): End of the searched range in milliseconds.
+            min_silence_len (int): The minimum length for any silent section.
+            silence_thresh (float): The upper bound for how quiet is silent in dBFS.
+            seek_step (int): Step size for iterating over the range in ms.
+
+        Returns:
+            list: [start, end] pairs in milliseconds relative to ``start``, identical
+            to ``detect_silence(audio[start:end], ...)``.
+        """
+        start, end, first, total = self.span(start, end)
+        seg_len = round(1000 * (float(total) / self.frame_rate))
+        if seg_len < min_silence_len:
+            return []
+
+        thresh = 10 ** (float(silence_thresh) / 20) * self.max_possible_amplitude
+        last_slice_start = seg_len - min_silence_len
+        offsets = np.arange(0, last_slice_start + 1, seek_step)
+        if last_slice_start % seek_step:
+            offsets = np.append(offsets, last_slice_start)
+
+        # Bound the temporaries when a whole multi-hour file is searched at once.
+        silence_starts = np.concatenate([
+            chunk[self._window_rms(chunk, start, end, first, total, min_silence_len) <= thresh]
+            for chunk in np.array_split(offsets, max(1, len(offsets) // BLOCK_FRAMES))
+        ])
+        if not len(silence_starts):
+            return []
+
+        # Merge overlapping windows into ranges the same way pydub does.
+        steps = np.diff(silence_starts)
+        breaks = np.flatnonzero((steps != seek_step) & (steps > min_silence_len))
+        range_starts = silence_starts[np.concatenate(([0], breaks + 1))]
+        range_ends = silence_starts[np.concatenate((breaks, [len(silence_starts) - 1]))] + min_silence_len
+        return [[int(s), int(e)] for s, e in zip(range_starts, range_ends)]
@@ -1,21 +1,36 @@
+import multiprocessing
 import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent, detect_silence
+from decoder import duration, iter_blocks, iter_cut_samples, map_wav, probe
+from encoder import DEFAULT_OUTPUT, OutputFormat, SliceEncoder, output_extension
+from metrics import Metrics, collect, record_state, timed, timed_iter
+from planner import VAD_PLANNER, plan_cuts, split_regions
+from shards import SHARD_FORMAT, ShardWriter
+from silence import SilenceEnvelope, segment_samples
+from vad import detect_pauses
 
 
-def save_audio(audio_segment, output_path, sample_rate=22050, bit_depth=16):
+def save_audio(audio_segment, output_path, sample_rate=22050, bit_depth=16, format="wav"):
     """
-    Save an AudioSegment to a .wav file with specified sample rate and bit depth.
+    Save an AudioSegment to a .wav or .flac file with specified sample rate and bit depth.
+
+    To write many slices of one source, use encoder.SliceEncoder directly so
+    the resampler is set up once.
 
     Parameters:
         audio_segment (AudioSegment): The audio segment to save.
-        output_path (str): Path to save the .wav file.
+        output_path (str): Path to save the file.
         sample_rate (int): The sample rate of the output file (default: 22050 Hz).
         bit_depth (int): The bit depth of the output file (default: 16-bit).
+        format (str): "wav" (default) or "flac".
     """
-    audio_segment = audio_segment.set_frame_rate(sample_rate).set_sample_width(bit_depth // 8)
-    audio_segment.export(output_path, format="wav")
-    
+    output = OutputFormat(format, sample_rate, bit_depth)
+    SliceEncoder.for_segment(audio_segment, output).write_segment(audio_segment, output_path)
+
 
 def is_silent(audio_segment, silence_thresh=-40.0):
     """
@@ -31,17 +46,270 @@ def is_silent(audio_segment, silence_thresh=-40.0):
     return audio_segment.dBFS < silence_thresh
 
 
-def slice_audio(input_folder, output_folder, min_length, max_length):
+def load_audio(file_path):
     """
-    Slice audio files in the input_folder, saving sliced segments to output_folder.
+    Decode a .wav or .mp3 file into an AudioSegment.
 
     Parameters:
-        input_folder (str): Path to the folder containing input .wav or .mp3 files.
-        output_folder (str): Path to save the sliced .wav files.
+        file_path (str): Path to the audio file.
+
+    Returns:
+        AudioSegment: The decoded audio.
+    """
+    if file_path.lower().endswith('.wav'):
+        return AudioSegment.from_wav(file_path)
+    return AudioSegment.from_mp3(file_path)
+
+
+def file_envelope(file_path, streaming=False):
+    """
+    Build the silence envelope of one audio file.
+
+    16- and 32-bit PCM WAV files are memory-mapped in either mode, which
+    bounds memory like streaming does without decoding the file twice.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        streaming (bool): Decode block by block instead of loading the whole file.
+
+    Returns:
+        tuple: (envelope, samples) where samples is a (frames, channels) array
+        of the whole file (memory-mapped for mappable WAVs), or None when
+        streaming.
+    """
+    mapped = map_wav(file_path) if file_path.lower().endswith('.wav') else None
+    if mapped is not None:
+        samples, frame_rate, sample_width = mapped
+        # Pages are read as the envelope touches them, so this includes the file reads
+        with timed("silence", len(samples) / frame_rate):
+            return SilenceEnvelope.from_samples(samples, frame_rate, sample_width), samples
+    if streaming:
+        frame_rate, channels, sample_width = probe(file_path)
+        blocks = timed_iter("decode", iter_blocks(file_path), frame_rate)
+        with timed("silence") as span:
+            envelope = SilenceEnvelope.from_blocks(blocks, frame_rate, channels, sample_width)
+            span.audio_seconds, span.exclude = blocks.audio_seconds, blocks.seconds
+        return envelope, None
+    with timed("decode") as span:
+        audio = load_audio(file_path)
+        samples = segment_samples(audio)
+        span.audio_seconds = len(audio) / 1000
+    with timed("silence", len(audio) / 1000):
+        return SilenceEnvelope.from_segment(audio), samples
+
+
+def plan_file_cuts(file_path, envelope, samples, min_length, max_length, planner="greedy"):
+    """
+    Plan the cuts of one analysed file, running the voice activity detector first for the "vad" planner.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        envelope (SilenceEnvelope): Envelope of the file.
+        samples (numpy.ndarray): The file's samples as file_envelope returns
+            them, or None to decode the file again block by block.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+
+    Returns:
+        list: Cut tuples in file order.
+    """
+    silences = None
+    if planner == VAD_PLANNER:
+        silences = detect_pauses(file_path, envelope, samples)
+    return plan_cuts(envelope, min_length, max_length, planner, silences)
+
+
+def plan_file(file_path, min_length, max_length, planner="greedy", streaming=False):
+    """
+    Plan the slices of one audio file without writing any audio.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+        streaming (bool): Decode block by block instead of loading the whole file.
+
+    Returns:
+        list: Cut tuples in file order.
+    """
+    envelope, samples = file_envelope(file_path, streaming)
+    return plan_file_cuts(file_path, envelope, samples, min_length, max_length, planner)
+
+
+def cut_segment(samples, cut, frame_rate, sample_width):
+    """
+    Return the audio of a planned cut.
+
+    Parameters:
+        samples (numpy.ndarray): The cut's frames, shape (frames, channels).
+        cut (Cut): The planned slice.
+        frame_rate (int): Sample rate of the source.
+        sample_width (int): Bytes per sample of the source.
+
+    Returns:
+        AudioSegment: The slice, padded with silence past the end of the source
+        the same way pydub slicing pads.
+    """
+    missing_frames = cut.end_frame - cut.start_frame - len(samples)
+    if len(samples) and missing_frames > 0:
+        samples = np.concatenate((samples, np.zeros((missing_frames, samples.shape[1]), samples.dtype)))
+    return AudioSegment(data=samples.tobytes(), sample_width=sample_width, frame_rate=frame_rate, channels=samples.shape[1])
+
+
+def slice_path(output_folder, name, index, output=DEFAULT_OUTPUT):
+    """Return the output path of slice `index` of the source named `name`."""
+    return os.path.join(output_folder, f"{name}_slice_{index}{output_extension(output)}")
+
+
+def slice_segments(cut_samples, frame_rate, sample_width):
+    """
+    Turn planned cuts into the slices that get saved.
+
+    Parameters:
+        cut_samples (iterable): (cut, samples) pairs in file order.
+        frame_rate (int): Sample rate of the source.
+        sample_width (int): Bytes per sample of the source.
+
+    Yields:
+        tuple: (cut, slice) where slice is the AudioSegment padded with 500 ms
+        of trailing silence, or None when it is empty or silent.
+    """
+    for cut, samples in cut_samples:
+        with timed("cut", (cut.end_frame - cut.start_frame) / frame_rate):
+            slice_audio = cut_segment(samples, cut, frame_rate, sample_width) + AudioSegment.silent(duration=500)
+            # Ensure non-empty and context-aware audio slices
+            silent = len(slice_audio) == 0 or is_silent(slice_audio)
+        yield cut, None if silent else slice_audio
+
+
+def save_slices(slices, output_folder, name, output=DEFAULT_OUTPUT):
+    """
+    Write the slices of one source file through a shared SliceEncoder, as
+    separate files or, for the "shard" format, appended to shards.
+
+    Parameters:
+        slices (iterable): (cut, slice) pairs as slice_segments yields them.
+        output_folder (str): Path to save the slices.
+        name (str): Output file prefix, usually the source file stem.
+        output (OutputFormat): How slices are written.
+
+    Yields:
+        tuple: (cut, path) for each cut once it has been handled, where path
+        is the written slice, or None for a silent slice. Silent slices are
+        not written, so their index stays unused.
+    """
+    encoder = None
+    shard_writer = None
+    try:
+        for cut, slice_audio in slices:
+            if slice_audio is not None:
+                if encoder is None:
+                    encoder = SliceEncoder.for_segment(slice_audio, output)
+                output_path = slice_path(output_folder, name, cut.index, output)
+                if output.format == SHARD_FORMAT:
+                    if shard_writer is None:
+                        shard_writer = ShardWriter(output_folder, name, output.sample_rate, slice_audio.channels)
+                    samples = encoder.encode(segment_samples(slice_audio))
+                    shard_writer.add(os.path.basename(output_path), samples, cut.index)
+                else:
+                    encoder.write_segment(slice_audio, output_path)
+                yield cut, output_path
+            else:
+                yield cut, None
+    finally:
+        if shard_writer is not None:
+            shard_writer.close()
+
+
+def write_slices(cut_samples, frame_rate, sample_width, output_folder, name, output=DEFAULT_OUTPUT):
+    """
+    Write the planned slices of one source file.
+
+    Parameters:
+        cut_samples (iterable): (cut, samples) pairs in file order.
+        frame_rate (int): Sample rate of the source.
+        sample_width (int): Bytes per sample of the source.
+        output_folder (str): Path to save the slices.
+        name (str): Output file prefix, usually the source file stem.
+        output (OutputFormat): How slices are written.
+
+    Yields:
+        tuple: (cut, path) for each cut once it has been handled, see save_slices.
+    """
+    yield from save_slices(slice_segments(cut_samples, frame_rate, sample_width), output_folder, name, output)
+
+
+def iter_file_slices(file_path, min_length, max_length, planner="greedy", streaming=False):
+    """
+    Plan and cut one audio file without writing anything.
+
+    In streaming mode the file is decoded twice block by block: once to build
+    the silence envelope and once to cut the planned slices, holding only a
+    rolling window of samples. The slices are identical to the in-memory path.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
         min_length (int): Minimum duration of a slice in milliseconds.
         max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+        streaming (bool): Keep memory bounded regardless of the file length.
+
+    Yields:
+        tuple: (cut, slice) as slice_segments does.
+    """
+    # Plan every cut from one analysis of the file, then cut them
+    envelope, samples = file_envelope(file_path, streaming)
+    cuts = plan_file_cuts(file_path, envelope, samples, min_length, max_length, planner)
+    yield from iter_planned_slices(file_path, cuts, envelope, samples)
+
+
+def iter_planned_slices(file_path, cuts, envelope, samples=None):
+    """
+    Cut already planned slices out of one audio file.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        cuts (list): Cut tuples in file order.
+        envelope (SilenceEnvelope): Envelope of the file, for its stream parameters.
+        samples (numpy.ndarray): The file's samples as file_envelope returns
+            them, or None to decode the file block by block.
+
+    Yields:
+        tuple: (cut, slice) as slice_segments does.
     """
-    sliced_audios = []
+    if samples is None:
+        cut_samples = iter_cut_samples(timed_iter("decode", iter_blocks(file_path), envelope.frame_rate), cuts)
+    else:
+        cut_samples = ((cut, samples[cut.start_frame:cut.end_frame]) for cut in cuts)
+    yield from slice_segments(cut_samples, envelope.frame_rate, envelope.sample_width)
+
+
+def slice_file(file_path, output_folder, min_length, max_length, planner="greedy", streaming=False,
+               output=DEFAULT_OUTPUT):
+    """
+    Slice one audio file into output_folder.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        output_folder (str): Path to save the slices.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): Cut planner to use, see planner.PLANNERS.
+        streaming (bool): Keep memory bounded regardless of the file length.
+        output (OutputFormat): How slices are written.
+
+    Yields:
+        tuple: (cut, path) for each planned cut once it has been handled, see save_slices.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    slices = iter_file_slices(file_path, min_length, max_length, planner, streaming)
+    yield from save_slices(slices, output_folder, name, output)
+
+
+def clear_output_folder(output_folder):
+    """Create output_folder, or remove the files left in it by a previous run."""
     if os.path.exists(output_folder):
         for file in os.listdir(output_folder):
             file_path = os.path.join(output_folder, file)
@@ -50,56 +318,192 @@ def slice_audio(input_folder, output_folder, min_length, max_length):
     else:
         os.makedirs(output_folder)
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith(('.wav', '.mp3')):
-            file_path = os.path.join(input_folder, filename)
-            if filename.lower().endswith('.wav'):
-                audio = AudioSegment.from_wav(file_path)
-            elif filename.lower().endswith('.mp3'):
-                audio = AudioSegment.from_mp3(file_path)
-
-            slice_start = 0
-            slice_index = 0
-
-            while slice_start < len(audio):
-                slice_end = slice_start + max_length
-
-                # Find the quietest point within the max_length window
-                window_audio = audio[slice_start:slice_end]
-                silence = detect_silence(window_audio, min_silence_len=500, silence_thresh=audio.dBFS-14)
-                best_silence_point = None
-
-                if silence:
-                    # Prioritize silences closer to max_length but still valid
-                    best_silence_point = max(
-                        (s for s in silence if s[0] >= min_length),
-                        key=lambda s: (s[1] - s[0], s[0]),
-                        default=None
-                    )
-
-                if best_silence_point:
-                    slice_end = slice_start + best_silence_point[0]
-                else:
-                    # If no good silence found, use max_length as fallback
-                    slice_end = min(slice_start + max_length, len(audio))
-
-                # Ensure slice_end does not cut through speech
-                slice_audio = audio[slice_start:slice_end]
-                
-
-                silence_in_slice = detect_silence(slice_audio, min_silence_len=500, silence_thresh=slice_audio.dBFS-14)
-                if silence_in_slice:
-                    last_silence_start = silence_in_slice[-1][0]
-                    if last_silence_start > min_length:
-                        slice_audio = slice_audio[:last_silence_start]
-
-                slice_audio = slice_audio + AudioSegment.silent(duration=500)
-                # Ensure non-empty and context-aware audio slices
-                if len(slice_audio) > 0 and not is_silent(slice_audio):
-                    output_path = os.path.join(output_folder, f"{os.path.splitext(filename)[0]}_slice_{slice_index}.wav")
-                    save_audio(slice_audio, output_path)
-                    sliced_audios.append(slice_audio)
-
-                slice_index += 1
-                slice_start = slice_end + 50  # Adjust for slight overlap to avoid premature slicing
-                yield filename
\ No newline at end of file
+
+def slice_params(min_length, max_length, planner, output):
+    """Return the settings that determine the slices of a file, as recorded in the manifest."""
+    # streaming and workers do not change the slices, so they are not part of the key
+    return {"min_length": min_length, "max_length": max_length, "planner": planner, "output": list(output)}
+
+
+def list_input_files(input_folder):
+    """Return the paths of the .wav and .mp3 files in input_folder, sorted by name."""
+    return [
+        os.path.join(input_folder, filename)
+        for filename in sorted(os.listdir(input_folder))
+        if filename.lower().endswith(('.wav', '.mp3'))
+    ]
+
+
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    """Process pool initializer: keep the queue slice progress is reported on."""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _slice_file_worker(file_path, output_folder, min_length, max_length, planner, streaming, region_length, output):
+    """
+    Slice one file in a pool worker, reporting each handled slice on the progress queue.
+
+    Files longer than twice region_length are only planned here: the cuts are
+    split into independent regions at strong silences and handed back so the
+    pool can write the regions concurrently.
+
+    Returns:
+        tuple: (number of slices handled, (index, file name) of each slice
+        written, list of region tasks, stage timings of this task as
+        metrics.Metrics.state returns them)
+    """
+    with collect(Metrics()) as metrics:
+        if region_length and duration(file_path) > 2 * region_length:
+            # Plan the whole file at once so the cuts (and their indices) are the
+            # same as when the file is sliced in one piece.
+            envelope, _ = file_envelope(file_path, streaming=True)
+            cuts = plan_file_cuts(file_path, envelope, None, min_length, max_length, planner)
+            regions = split_regions(cuts, int(region_length * envelope.frames_per_ms))
+            return 0, [], [(file_path, region, envelope.frame_rate, envelope.sample_width) for region in regions], \
+                metrics.state()
+
+        filename = os.path.basename(file_path)
+        count = 0
+        written = []
+        for cut, output_path in slice_file(file_path, output_folder, min_length, max_length, planner, streaming, output):
+            _progress_queue.put(filename)
+            count += 1
+            if output_path is not None:
+                written.append((cut.index, os.path.basename(output_path)))
+    return count, written, [], metrics.state()
+
+
+def _slice_region_worker(file_path, cuts, frame_rate, sample_width, output_folder, output):
+    """Write one region of planned cuts in a pool worker, decoding only that region."""
+    filename = os.path.basename(file_path)
+    with collect(Metrics()) as metrics:
+        mapped = map_wav(file_path) if file_path.lower().endswith('.wav') else None
+        if mapped is not None:
+            samples = mapped[0]
+            cut_samples = ((cut, samples[cut.start_frame:cut.end_frame]) for cut in cuts)
+        else:
+            start_frame = cuts[0].start_frame
+            blocks = iter_blocks(file_path, start_frame=start_frame, end_frame=cuts[-1].end_frame)
+            cut_samples = iter_cut_samples(timed_iter("decode", blocks, frame_rate), cuts, start_frame)
+        name = os.path.splitext(filename)[0]
+        count = 0
+        written = []
+        for cut, output_path in write_slices(cut_samples, frame_rate, sample_width, output_folder, name, output):
+            _progress_queue.put(filename)
+            count += 1
+            if output_path is not None:
+                written.append((cut.index, os.path.basename(output_path)))
+    return count, written, [], metrics.state()
+
+
+def _slice_files_parallel(file_paths, output_folder, min_length, max_length, planner, streaming, workers, region_length,
+                          output, on_file_sliced=None):
+    """
+    Slice files on a process pool, yielding a file name for every handled slice.
+
+    Workers write their slices directly and report progress through a queue,
+    so the caller sees slices as they complete rather than per file. Long files
+    come back from their first task as regions, which are queued as tasks of
+    their own. on_file_sliced is called with a file's path and the names of
+    its written slices, in index order, once all of its tasks have finished.
+    """
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(progress_queue,)) as executor:
+        pending = {
+            executor.submit(_slice_file_worker, file_path, output_folder, min_length, max_length,
+                            planner, streaming, region_length, output): file_path
+            for file_path in file_paths
+        }
+        written = {file_path: [] for file_path in file_paths}
+        expected = 0
+        reported = 0
+        while pending or reported < expected:
+            try:
+                yield progress_queue.get(timeout=0.2)
+                reported += 1
+            except queue.Empty:
+                pass
+            except GeneratorExit:
+                # The caller stopped (e.g. a cancelled job): drop the files not started yet
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            for future in [future for future in pending if future.done()]:
+                file_path = pending.pop(future)
+                count, file_written, regions, timings = future.result()  # raises the worker's error
+                record_state(timings)
+                expected += count
+                written[file_path].extend(file_written)
+                for _, cuts, frame_rate, sample_width in regions:
+                    pending[executor.submit(_slice_region_worker, file_path, cuts, frame_rate,
+                                            sample_width, output_folder, output)] = file_path
+                if on_file_sliced and file_path not in pending.values():
+                    on_file_sliced(file_path, [filename for _, filename in sorted(written.pop(file_path))])
+
+
+def slice_audio(input_folder, output_folder, min_length, max_length, planner="greedy", streaming=False, workers=1,
+                region_length=None, manifest=None, output=DEFAULT_OUTPUT, file_paths=None):
+    """
+    Slice audio files in the input_folder, saving sliced segments to output_folder.
+
+    Parameters:
+        input_folder (str): Path to the folder containing input .wav or .mp3 files.
+        output_folder (str): Path to save the slices.
+        min_length (int): Minimum duration of a slice in milliseconds.
+        max_length (int): Maximum duration of a slice in milliseconds.
+        planner (str): "greedy" (default), "optimal" or "vad", see planner.plan_cuts.
+        streaming (bool): Decode in fixed-size blocks so memory use does not
+            grow with the length of the input files.
+        workers (int): Number of processes slicing files in parallel (default: 1,
+            slice in this process). Slice names do not depend on it.
+        region_length (int): With several workers, split files longer than twice
+            this many milliseconds into regions at strong silences and slice the
+            regions concurrently (default: None, one task per file).
+        manifest (Manifest): Keep the output folder between runs and only
+            slice inputs that are new or changed since the manifest recorded
+            them (default: None, clear the folder and slice everything).
+        output (OutputFormat): Container, sample rate and bit depth of the
+            slices (default: 16-bit 22050 Hz WAV). The "shard" format packs
+            the slices of each source into shards, see shards.ShardWriter.
+        file_paths (list): Only handle these input files of input_folder, e.g.
+            the settled ones an ingest.WatchFolder scan found (default: None,
+            every .wav/.mp3 file in it). With a manifest, recorded inputs are
+            still only pruned once they are gone from input_folder.
+
+    Yields:
+        str: The input file name, once per handled slice.
+    """
+    input_paths = list_input_files(input_folder)
+    file_paths = input_paths if file_paths is None else list(file_paths)
+    on_file_sliced = None
+    if manifest is not None and output.format == SHARD_FORMAT:
+        raise ValueError("Shard output does not support incremental runs")
+    if manifest is None:
+        clear_output_folder(output_folder)
+    else:
+        params = slice_params(min_length, max_length, planner, output)
+        os.makedirs(output_folder, exist_ok=True)
+        manifest.prune(input_paths)
+        file_paths = [file_path for file_path in file_paths if not manifest.is_sliced(file_path, params)]
+        for file_path in file_paths:
+            manifest.discard_slices(file_path)
+        on_file_sliced = lambda file_path, slices: manifest.record_slices(file_path, params, slices)
+
+    if workers and workers > 1 and (len(file_paths) > 1 or region_length):
+        yield from _slice_files_parallel(file_paths, output_folder, min_length, max_length, planner, streaming,
+                                         workers, region_length, output, on_file_sliced)
+        return
+
+    for file_path in file_paths:
+        written = []
+        for _, output_path in slice_file(file_path, output_folder, min_length, max_length, planner, streaming, output):
+            if output_path is not None:
+                written.append(os.path.basename(output_path))
+            yield os.path.basename(file_path)
+        if on_file_sliced:
+            on_file_sliced(file_path, written)
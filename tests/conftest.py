@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, as for benchmarks/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def whisper_model():
+    """
+    A Whisper model with random weights and the real architecture.
+
+    Its output is gibberish, but it runs the real encoder, decoder, tokenizer
+    and DecodingOptions without downloading a checkpoint.
+    """
+    torch = pytest.importorskip("torch")
+    whisper_model = pytest.importorskip("whisper.model")
+
+    torch.manual_seed(0)
+    dims = whisper_model.ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=2,
+        n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=2,
+    )
+    return whisper_model.Whisper(dims).eval()
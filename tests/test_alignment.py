@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import pipeline
+from alignment import Word, assign_words, snap_cuts
+from benchmarks.synthetic import speech_like
+from planner import Cut
+from slicer import file_envelope
+
+RATE = 16000
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.wav"
+    sf.write(path, speech_like(120, RATE), RATE, subtype="PCM_16")
+    return str(path)
+
+
+def make_cut(envelope, index, start, end):
+    start, end, first_frame, frames = envelope.span(start, end)
+    return Cut(index, start, end, first_frame, first_frame + frames)
+
+
+def test_snap_moves_cut_points_to_word_edges(source):
+    envelope, _ = file_envelope(source)
+    cuts = [make_cut(envelope, 0, 1000, 6000), make_cut(envelope, 1, 6000, 11000)]
+    words = [Word(5900, 6200, " over"), Word(10800, 11300, " there")]
+    snapped = snap_cuts(cuts, words, envelope, 3000, 11000)
+    # The shared point moves for both slices, the end to the nearer edge of "there"
+    assert [(cut.start, cut.end) for cut in snapped] == [(1000, 5900), (5900, 10800)]
+    assert snapped[0].end_frame == snapped[1].start_frame
+
+
+def test_snap_keeps_slices_within_length_bounds(source):
+    envelope, _ = file_envelope(source)
+    cuts = [make_cut(envelope, 0, 1000, 4000), make_cut(envelope, 1, 4000, 7000)]
+    # Either edge of "word" would make one of the slices shorter than 3 s
+    words = [Word(3900, 4150, " word")]
+    assert snap_cuts(cuts, words, envelope, 3000, 11000) == cuts
+    # The far edge is used when the nearer one is out of bounds
+    cuts = [make_cut(envelope, 0, 1000, 4000), make_cut(envelope, 1, 4000, 14900)]
+    words = [Word(3950, 4100, " word")]
+    snapped = snap_cuts(cuts, words, envelope, 3000, 11000)
+    assert [(cut.start, cut.end) for cut in snapped] == [(1000, 4100), (4100, 14900)]
+
+
+def test_snap_never_overlaps_slices(source):
+    envelope, _ = file_envelope(source)
+    cuts = [make_cut(envelope, 0, 1000, 5000), make_cut(envelope, 1, 5100, 9000)]
+    words = [Word(4900, 5200, " across")]
+    snapped = snap_cuts(cuts, words, envelope, 3000, 11000)
+    assert snapped[0].end <= snapped[1].start
+
+
+class StubWhisper:
+    """Stands in for a Whisper model: one word per second of the audio it is given."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None, word_timestamps=False, initial_prompt=None):
+        assert word_timestamps
+        self.calls.append((len(audio), initial_prompt))
+        seconds = len(audio) // RATE
+        words = [{"start": s + 0.2, "end": s + 0.6, "word": f" w{len(self.calls)}.{s}"} for s in range(seconds)]
+        return {"segments": [{"words": words}]}
+
+
+def test_source_mode_transcribes_one_region_at_a_time(source, tmp_path):
+    model = StubWhisper()
+    region_length = 30000
+    results = list(pipeline.slice_and_transcribe_sources(
+        str(tmp_path), str(tmp_path / "sliced"), 3000, 11000, model, file_paths=[source], region_length=region_length,
+    ))
+    assert results
+    assert len(model.calls) > 1
+    # Regions close within 25% past the target length, at the end of a slice
+    assert max(samples for samples, _ in model.calls) <= RATE * (region_length * 1.25 + 11000) / 1000
+    assert sum(samples for samples, _ in model.calls) == pytest.approx(120 * RATE, abs=len(model.calls))
+    assert model.calls[0][1] is None
+    assert model.calls[1][1].startswith("w1.0 w1.1")
+
+
+def test_region_words_are_in_file_time(source):
+    envelope, samples = file_envelope(source)
+    cuts = pipeline.plan_file_cuts(source, envelope, samples, 3000, 11000)
+    model = StubWhisper()
+    words = pipeline.region_words(model, source, cuts, envelope, samples, region_length=30000)
+    starts = [word.start for word in words]
+    assert starts == sorted(starts)
+    # Every region starts at the first slice of its region, so its words start there too
+    second = words.index(next(word for word in words if word.text.startswith(" w2.")))
+    assert cuts[0].start <= 200
+    assert any(abs(words[second].start - 200 - cut.start) <= 1 for cut in cuts)
+    texts = assign_words(words, cuts, envelope.frame_rate)
+    assert all(texts[cut.index] for cut in cuts if cut.end - cut.start >= 1000)
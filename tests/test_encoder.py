@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from encoder import SUBTYPES, OutputFormat, SliceEncoder
+
+RATE = 16000
+# Source sample widths in bytes (pydub layout) and their dtypes
+SOURCES = {2: np.int16, 4: np.int32}
+OUTPUTS = [OutputFormat(container, sample_rate, bit_depth)
+           for container, bit_depth in SUBTYPES if container in ("wav", "flac")
+           for sample_rate in (RATE, 22050)]
+
+
+@pytest.mark.parametrize("sample_width", SOURCES)
+@pytest.mark.parametrize("output", OUTPUTS, ids=lambda o: f"{o.format}-{o.sample_rate}-{o.bit_depth}")
+def test_full_scale_keeps_its_sign(tmp_path, sample_width, output):
+    info = np.iinfo(SOURCES[sample_width])
+    # A second at +1.0 then a second at -1.0
+    samples = np.repeat([[info.max], [info.min]], RATE, axis=0).astype(info.dtype)
+    path = str(tmp_path / f"slice.{output.format}")
+    SliceEncoder(RATE, 1, sample_width, output).write(samples, path)
+
+    audio, sample_rate = sf.read(path)
+    assert sample_rate == output.sample_rate
+    half = len(audio) // 2
+    # Away from the resampler's ringing at the edges and the step
+    assert audio[500:half - 500].min() > 0.99
+    assert audio[half + 500:-500].max() < -0.99
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import soundfile as sf
+
+from manifest import Manifest
+from slicer import slice_audio
+
+PARAMS = {"min_length": 3000, "max_length": 11000, "planner": "greedy", "output": ["wav", 22050, 16]}
+
+
+def touch(folder, *names):
+    for name in names:
+        with open(os.path.join(folder, name), "wb") as file:
+            file.write(name.encode())
+
+
+def test_discard_only_deletes_recorded_slices(tmp_path):
+    inputs, output = tmp_path / "in", tmp_path / "out"
+    inputs.mkdir()
+    output.mkdir()
+    touch(inputs, "x.wav", "x.mp3")
+    touch(output, "x_slice_0.wav", "x_slice_1.wav", "x_slice_2.wav", "x_slice_3.wav")
+
+    manifest = Manifest(str(output))
+    manifest.record_slices(str(inputs / "x.wav"), PARAMS, ["x_slice_0.wav", "x_slice_1.wav"])
+    manifest.record_slices(str(inputs / "x.mp3"), PARAMS, ["x_slice_1.wav", "x_slice_2.wav"])
+    manifest.discard_slices(str(inputs / "x.mp3"))
+
+    # x_slice_1 is x.wav's too, x_slice_3 is nobody's
+    assert sorted(os.listdir(output)) == ["manifest.json", "x_slice_0.wav", "x_slice_1.wav", "x_slice_3.wav"]
+    assert manifest.slices(str(inputs / "x.wav")) == ["x_slice_0.wav", "x_slice_1.wav"]
+    assert manifest.slices(str(inputs / "x.mp3")) == []
+
+
+def test_slice_audio_records_written_slices(tmp_path):
+    inputs, output = tmp_path / "in", tmp_path / "out"
+    inputs.mkdir()
+    rng = np.random.default_rng(0)
+    rate = 16000
+    # Bursts of noise separated by near-silent pauses, with a silent stretch in the middle
+    parts = []
+    for seconds in (4, 5, 0, 6, 4):
+        parts.append(rng.standard_normal(seconds * rate) * 0.3 if seconds else np.zeros(8 * rate))
+        parts.append(rng.standard_normal(rate) * 0.0005)
+    sf.write(inputs / "a.wav", np.concatenate(parts).astype(np.float32), rate, subtype="PCM_16")
+
+    manifest = Manifest(str(output))
+    list(slice_audio(str(inputs), str(output), 3000, 11000, manifest=manifest))
+    recorded = manifest.slices(str(inputs / "a.wav"))
+    assert recorded
+    assert sorted(recorded) == sorted(name for name in os.listdir(output) if name != "manifest.json")
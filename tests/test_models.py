@@ -0,0 +1,22 @@
+import copy
+
+import numpy as np
+import pytest
+
+import transcribe
+from models import model_size, quantize
+
+
+def test_quantize_converts_every_linear_layer(whisper_model, monkeypatch):
+    torch = pytest.importorskip("torch")
+
+    model = copy.deepcopy(whisper_model)
+    linear = sum(isinstance(module, torch.nn.Linear) for module in model.modules())
+    quantized = quantize(model)
+    dynamic = [module for module in quantized.modules() if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+    assert linear and len(dynamic) == linear
+    assert model_size(quantized) < model_size(whisper_model)
+
+    monkeypatch.setattr(transcribe, "TEMPERATURES", (0.0,))
+    clip = (np.random.default_rng(0).standard_normal(16000 * 3) * 0.1).astype(np.float32)
+    assert transcribe.transcribe_batch(quantized, [clip], language="en")[0]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from benchmarks.synthetic import speech_like, write_dataset
+import planner
+from slicer import file_envelope
+
+BOUNDS = [(1000, 3000), (2000, 5000), (3000, 3050), (2000, 2000), (3000, 11000), (1000, 20000)]
+
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("sources")
+    paths = write_dataset(str(folder), 2, 95, seed=3)
+    stereo = speech_like(70, 22050, seed=9)
+    paths.append(str(folder / "stereo.wav"))
+    sf.write(paths[-1], np.stack([stereo, stereo], axis=1) * 0.8, 22050, subtype="PCM_16")
+    return [file_envelope(path)[0] for path in paths]
+
+
+@pytest.mark.parametrize("min_length, max_length", BOUNDS)
+@pytest.mark.parametrize("name", ["optimal", planner.VAD_PLANNER])
+def test_optimal_slices_stay_within_bounds(sources, name, min_length, max_length):
+    # synthetic_4_95s at 1000/3000 and stereo at 2000/5000 have hard cuts
+    # inside silences, which once left the search without a plan
+    for envelope in sources:
+        silences = None
+        if name == planner.VAD_PLANNER:
+            # Shorter pauses than the loudness search finds, standing in for a VAD's
+            silences = envelope.detect_silence(0, len(envelope), 200, envelope.dbfs() - 10)
+        cuts = planner.plan_cuts(envelope, min_length, max_length, name, silences)
+        assert cuts[0].start == 0 and cuts[-1].end == len(envelope)
+        assert all(min_length <= cut.end - cut.start <= max_length for cut in cuts[:-1])
+        assert cuts[-1].end - cuts[-1].start <= max_length
+
+
+def test_impossible_bounds_raise(sources):
+    with pytest.raises(ValueError):
+        planner.plan_cuts(sources[0], 5000, 3000, "optimal")
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from preprocess import _view_names, preprocess_folder, remove_view
+from slicer import slice_audio
+
+
+def test_view_names_keep_the_stem():
+    assert _view_names(["/in/a.wav", "/in/b.mp3"]) == ["a.wav", "b.wav"]
+    # Only inputs sharing a stem keep their extension, clear of other names
+    assert _view_names(["/in/a.mp3", "/in/a.wav", "/in/a_wav.wav", "/in/c.wav"]) == [
+        "a_mp3.wav", "a_wav_1.wav", "a_wav.wav", "c.wav"]
+
+
+def test_each_call_gets_its_own_view(tmp_path):
+    pytest.importorskip("noisereduce")
+    inputs, cache = tmp_path / "in", tmp_path / "cache"
+    inputs.mkdir()
+    rng = np.random.default_rng(0)
+    sf.write(inputs / "a.wav", (rng.standard_normal(16000 * 2) * 0.1).astype(np.float32), 16000, subtype="PCM_16")
+
+    first, first_paths = preprocess_folder(str(inputs), str(cache), "denoise")
+    second, second_paths = preprocess_folder(str(inputs), str(cache), "denoise")
+    assert first != second
+    assert [os.path.basename(path) for path in first_paths] == ["a.wav"]
+    # Both views link the one cached copy, and no temporary file is left behind
+    assert os.path.samefile(first_paths[0], second_paths[0])
+    assert not [name for _, _, names in os.walk(cache) for name in names if name.endswith(".tmp")]
+
+    remove_view(first)
+    assert not os.path.exists(first)
+    assert os.path.exists(second_paths[0])
+
+
+def test_slices_of_cleaned_files_keep_their_names(tmp_path):
+    pytest.importorskip("noisereduce")
+    inputs, cache, output = tmp_path / "in", tmp_path / "cache", tmp_path / "out"
+    inputs.mkdir()
+    rng = np.random.default_rng(0)
+    burst = np.concatenate([rng.standard_normal(16000 * 4) * 0.3, np.zeros(16000)])
+    for name in ("a.wav", "b.wav"):
+        sf.write(inputs / name, np.tile(burst, 3).astype(np.float32), 16000, subtype="PCM_16")
+
+    view, _ = preprocess_folder(str(inputs), str(cache), "denoise")
+    try:
+        list(slice_audio(view, str(output), 3000, 11000))
+    finally:
+        remove_view(view)
+    names = os.listdir(output)
+    assert names and all(name.endswith(".wav") for name in names)
+    assert {name.split("_slice_")[0] for name in names} == {"a", "b"}
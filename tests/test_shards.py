@@ -0,0 +1,35 @@
+import json
+
+import numpy as np
+import pytest
+
+from shards import ShardReader, ShardWriter
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_slices_read_back_as_written(tmp_path, channels):
+    rng = np.random.default_rng(0)
+    slices = {f"a_slice_{i}": rng.integers(-32768, 32768, (frames, channels), dtype=np.int16)
+              for i, frames in enumerate([16000, 1, 48000, 0, 23999, 32000])}
+    # Small shards, so slices spread over several and offsets restart in each
+    with ShardWriter(str(tmp_path), "a", 16000, channels, max_bytes=60000 * channels * 2) as writer:
+        for index, (name, samples) in enumerate(slices.items()):
+            writer.add(name, samples, index)
+
+    reader = ShardReader(str(tmp_path))
+    assert reader.names() == list(slices)
+    index_paths = sorted(tmp_path.glob("a_shard_*.json"))
+    assert len(index_paths) > 1
+    for index_path in index_paths:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        offsets = np.cumsum([0] + [entry["frames"] for entry in index["slices"]])
+        assert [entry["offset"] for entry in index["slices"]] == offsets[:-1].tolist()
+    for name, samples in slices.items():
+        audio, sample_rate = reader.audio(name)
+        assert sample_rate == 16000
+        assert audio.shape == samples.shape
+        assert (audio == samples).all()
+        assert reader.text(name) is None
+
+    reader.set_texts({"a_slice_2": "hello"})
+    assert ShardReader(str(tmp_path)).text("a_slice_2") == "hello"
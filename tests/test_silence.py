@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+
+from benchmarks.synthetic import speech_like
+from silence import SilenceEnvelope
+from slicer import file_envelope
+
+RATE = 22050
+RANGES = [(0, None), (0, 1000), (1234, 4567), (2500, 2501), (5000, None)]
+THRESHOLDS = [-50, -40, -30, -20]
+
+
+@pytest.fixture(params=[("mono", 1, "PCM_16"), ("stereo", 2, "PCM_16"), ("24bit", 1, "PCM_24")], ids=lambda p: p[0])
+def source(request, tmp_path):
+    name, channels, subtype = request.param
+    rng = np.random.default_rng(1)
+    audio = speech_like(12, RATE, seed=1)
+    if channels == 2:
+        audio = np.stack([audio, audio * 0.5 + rng.normal(0, 0.001, len(audio))], axis=1)
+    path = str(tmp_path / f"{name}.wav")
+    sf.write(path, audio, RATE, subtype=subtype)
+    return path
+
+
+def envelopes(path):
+    yield SilenceEnvelope.from_segment(AudioSegment.from_wav(path))
+    yield file_envelope(path)[0]
+    yield file_envelope(path, streaming=True)[0]
+
+
+def test_envelope_matches_pydub(source):
+    audio = AudioSegment.from_wav(source)
+    for envelope in envelopes(source):
+        assert len(envelope) == len(audio)
+        for start, end in RANGES:
+            end = len(audio) if end is None else end
+            assert envelope.dbfs(start, end) == pytest.approx(audio[start:end].dBFS)
+            for threshold in THRESHOLDS:
+                for min_silence_len in (100, 300):
+                    expected = detect_silence(audio[start:end], min_silence_len=min_silence_len,
+                                              silence_thresh=threshold, seek_step=1)
+                    assert envelope.detect_silence(start, end, min_silence_len=min_silence_len,
+                                                   silence_thresh=threshold, seek_step=1) == expected
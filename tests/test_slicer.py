@@ -0,0 +1,43 @@
+import os
+
+import pytest
+import soundfile as sf
+
+from benchmarks.synthetic import speech_like
+from slicer import slice_audio
+
+RATE = 16000
+MODES = {
+    "default": {},
+    "streaming": {"streaming": True},
+    "workers": {"workers": 2},
+    "regions": {"workers": 2, "region_length": 10000},
+}
+
+
+def slices(folder):
+    return {name: sf.read(os.path.join(folder, name), dtype="int16")[0] for name in sorted(os.listdir(folder))}
+
+
+# 24-bit WAVs cannot be memory-mapped, so streaming really decodes block by block
+@pytest.mark.parametrize("subtype", ["PCM_16", "PCM_24"])
+@pytest.mark.parametrize("planner", ["greedy", "optimal"])
+def test_modes_write_the_same_slices(tmp_path, subtype, planner):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    sf.write(inputs / "a.wav", speech_like(60, RATE, seed=2), RATE, subtype=subtype)
+    sf.write(inputs / "b.wav", speech_like(25, RATE, seed=3), RATE, subtype=subtype)
+
+    written = {}
+    for mode, options in MODES.items():
+        output = str(tmp_path / mode)
+        list(slice_audio(str(inputs), output, 3000, 11000, planner=planner, **options))
+        written[mode] = slices(output)
+
+    expected = written.pop("default")
+    assert len(expected) > 5
+    for mode, found in written.items():
+        assert list(found) == list(expected), mode
+        for name, samples in expected.items():
+            assert len(found[name]) == len(samples), (mode, name)
+            assert (found[name] == samples).all(), (mode, name)
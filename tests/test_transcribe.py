@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+import transcribe
+
+
+@pytest.fixture
+def clips():
+    rng = np.random.default_rng(0)
+    return [(rng.standard_normal(int(16000 * seconds)) * 0.1).astype(np.float32) for seconds in (2, 5, 3, 8, 1)]
+
+
+def test_batched_output_equals_sequential(whisper_model, clips, monkeypatch):
+    # Fallback temperatures sample, so only the greedy pass is deterministic
+    monkeypatch.setattr(transcribe, "TEMPERATURES", (0.0,))
+    batched = transcribe.transcribe_batch(whisper_model, clips, batch_size=4, language="en")
+    sequential = transcribe.transcribe_batch(whisper_model, clips, batch_size=1, language="en")
+    assert len(batched) == len(clips)
+    assert all(batched)
+    assert batched == sequential
+
+
+class Interrupted(Exception):
+    pass
+
+
+def run(folder, rows, stop=None, skip=False):
+    """Write rows like a transcription run, raising after stop rows; skip uses resume()."""
+    with transcribe.TranscriptionWriter(str(folder), "path|text", checkpoint_rows=3) as writer:
+        start = writer.resume([key for key, _ in rows]) if skip else 0
+        for written, (key, row) in enumerate(rows[start:], start):
+            if written == stop:
+                raise Interrupted
+            writer.write(row, key)
+    return start
+
+
+@pytest.mark.parametrize("stop", [0, 1, 4, 7, 9])
+@pytest.mark.parametrize("skip", [False, True], ids=["replay", "resume"])
+@pytest.mark.parametrize("torn", [False, True], ids=["abort", "torn"])
+def test_resumed_run_writes_every_row_once(tmp_path, stop, skip, torn):
+    rows = [(f"slice_{i}.wav", f"slice_{i}.wav|text {i}") for i in range(10)]
+    with pytest.raises(Interrupted):
+        run(tmp_path, rows, stop)
+    if torn:
+        # A row half written when the process died, past the last checkpoint
+        with open(tmp_path / "transcriptions.csv.partial", "ab") as file:
+            file.write(b"slice_9.wav|te")
+    resumed = run(tmp_path, rows, skip=skip)
+    # Interrupting checkpoints every row written before it
+    assert resumed == (stop if skip else 0)
+
+    lines = (tmp_path / "transcriptions.csv").read_text(encoding="utf-8").splitlines()
+    assert lines == ["path|text"] + [row for _, row in rows]
+    assert sorted(os.listdir(tmp_path)) == ["transcriptions.csv"]
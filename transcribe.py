@@ -1,22 +1,270 @@
+import hashlib
+import json
 import os
-from typing import List
+import time
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from metrics import timed
+
+# torch and whisper load in seconds; they are imported by the functions that
+# run the model, so slicing and the CSV writer do not pay for them
+if TYPE_CHECKING:
+    import torch
+
+# Same fallback rules whisper.transcribe applies to each 30 s window
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# How often TranscriptionWriter makes the rows written so far durable
+CHECKPOINT_ROWS = 100
+CHECKPOINT_SECONDS = 10.0
 
 def get_audio_files(input_folder: str) -> List[str]:
-    """Retrieve a list of audio files (mp3/wav) in the input folder."""
-    supported_extensions = (".mp3", ".wav")
-    return [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith(supported_extensions)]
+    """Retrieve a list of audio files (mp3/wav/flac) in the input folder."""
+    supported_extensions = (".mp3", ".wav", ".flac")
+    # Sorted, so a resumed transcription visits the files in the same order
+    return [os.path.join(input_folder, f) for f in sorted(os.listdir(input_folder)) if f.endswith(supported_extensions)]
 
 def transcribe_audio(model, audio_path: str) -> str:
     """Transcribe an audio file using Whisper."""
     result = model.transcribe(audio_path)
     return result.get("text", "")
 
-def save_transcriptions_to_csv(transcriptions: List[str], output_path: str, header: str):
-    output_csv_path = os.path.join(output_path, "transcriptions.csv")
+def _needs_fallback(result) -> bool:
+    """Whether a decoding result fails whisper's quality checks and should be retried hotter."""
+    if result.compression_ratio > COMPRESSION_RATIO_THRESHOLD:
+        return True
+    return result.avg_logprob < LOGPROB_THRESHOLD and result.no_speech_prob <= NO_SPEECH_THRESHOLD
+
+def _decode_batch(model, mel: "torch.Tensor", language: Optional[str]) -> List[str]:
+    """Decode a batch of 30 s log-mel windows, retrying failed items at higher temperatures."""
+    import whisper
+
+    fp16 = model.device.type != "cpu"
+    texts: List[Optional[str]] = [None] * len(mel)
+    pending = list(range(len(mel)))
+    results = {}
+    for temperature in TEMPERATURES:
+        options = whisper.DecodingOptions(
+            language=language,
+            temperature=temperature,
+            without_timestamps=True,
+            fp16=fp16,
+            best_of=5 if temperature > 0 else None,
+        )
+        decoded = whisper.decode(model, mel[pending], options)
+        retry = []
+        for index, result in zip(pending, decoded):
+            results[index] = result
+            if temperature != TEMPERATURES[-1] and _needs_fallback(result):
+                retry.append(index)
+        pending = retry
+        if not pending:
+            break
+
+    for index, result in results.items():
+        silent = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+        texts[index] = "" if silent else result.text
+    return texts
+
+def transcribe_batch(model, audio: Sequence[Union[str, np.ndarray]], batch_size: int = 16,
+                     language: Optional[str] = None) -> List[str]:
+    """
+    Transcribe many short clips with batched Whisper inference.
+
+    Each clip is padded to one 30 s log-mel window and batch_size windows go
+    through the encoder and decoder together. `audio` holds file paths or
+    16 kHz float32 sample arrays; the returned texts are in the same order.
+    Clips longer than 30 s are transcribed on their own with model.transcribe.
+    """
+    import torch
+    import whisper
+
+    texts: List[str] = []
+    for start in range(0, len(audio), batch_size):
+        clips = list(audio[start:start + batch_size])
+        paths = [i for i, clip in enumerate(clips) if isinstance(clip, str)]
+        if paths:
+            with timed("decode", calls=len(paths)) as span:
+                for i in paths:
+                    clips[i] = whisper.load_audio(clips[i])
+                span.audio_seconds = sum(len(clips[i]) for i in paths) / whisper.audio.SAMPLE_RATE
+        short = [i for i, clip in enumerate(clips) if len(clip) <= whisper.audio.N_SAMPLES]
+        batch_texts = [""] * len(clips)
+        # One call per slice, so seconds / calls is the inference time per slice
+        with timed("inference", sum(len(clip) for clip in clips) / whisper.audio.SAMPLE_RATE, len(clips)):
+            if short:
+                mel = torch.stack([
+                    whisper.log_mel_spectrogram(whisper.pad_or_trim(clips[i]), n_mels=model.dims.n_mels)
+                    for i in short
+                ]).to(model.device)
+                for i, text in zip(short, _decode_batch(model, mel, language)):
+                    batch_texts[i] = text
+            for i, clip in enumerate(clips):
+                if len(clip) > whisper.audio.N_SAMPLES:
+                    batch_texts[i] = model.transcribe(clip, language=language).get("text", "")
+        texts.extend(batch_texts)
+    return texts
+
+def format_row(metadata_format: str, file_path: str, text: str, speaker_name: str) -> str:
+    """Format one transcriptions.csv row, e.g. with "{audio_file}|{text}|{speaker_name}"."""
+    return metadata_format.format(audio_file=os.path.abspath(file_path), text=text.strip(), speaker_name=speaker_name)
+
+def _chain_digest(digest: str, key: str) -> str:
+    """Extend a running digest of the row keys written so far by one key."""
+    return hashlib.blake2b(f"{digest}\n{key}".encode("utf-8"), digest_size=16).hexdigest()
+
+class TranscriptionWriter:
+    """
+    Stream rows to transcriptions.csv as they are produced.
+
+    Rows go to transcriptions.csv.partial and are flushed and fsynced every
+    checkpoint_rows rows or checkpoint_seconds seconds, after which a small
+    .checkpoint file records how many rows (and bytes) are durable. close()
+    renames the partial file over transcriptions.csv, so the final file is
+    either the previous complete one or the new complete one.
+
+    When a run is restarted with the same header, the partial file is cut
+    back to the last checkpoint and the rows before it are kept. Callers
+    write every row in the same order as before: rows that are already on
+    disk are only checked against the recorded keys and not written again.
+    If the keys differ (the inputs changed), the file is rewritten from the
+    first row. resume() lets a caller that knows its keys up front skip the
+    work for those rows altogether.
+    """
+
+    def __init__(self, output_path: str, header: str, resume: bool = True,
+                 checkpoint_rows: int = CHECKPOINT_ROWS, checkpoint_seconds: float = CHECKPOINT_SECONDS):
+        self.path = os.path.join(output_path, "transcriptions.csv")
+        self.partial_path = self.path + ".partial"
+        self.checkpoint_path = self.path + ".checkpoint"
+        self.header = header
+        self.checkpoint_rows = checkpoint_rows
+        self.checkpoint_seconds = checkpoint_seconds
+        self.rows = 0
+        self._digest = ""
+        self._replay: List[str] = []
+        self._resumed_rows = 0
+        self._resumed_digest = ""
+
+        state = self._read_checkpoint() if resume else None
+        if state and state["header"] == header and os.path.getsize(self.partial_path) >= state["offset"]:
+            self._file = open(self.partial_path, "r+b")
+            self._file.truncate(state["offset"])
+            self._file.seek(state["offset"])
+            self._resumed_rows = state["rows"]
+            self._resumed_digest = state["digest"]
+        else:
+            self._file = open(self.partial_path, "wb")
+            self._file.write(f"{header}\n".encode("utf-8"))
+        self._checkpointed_rows = self._resumed_rows
+        self._checkpointed_at = time.monotonic()
+
+    def _read_checkpoint(self) -> Optional[dict]:
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.partial_path)):
+            return None
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as file:
+                return json.load(file)
+        except ValueError:
+            return None
+
+    @property
+    def replaying(self) -> bool:
+        """Whether rows are still being matched against the ones kept from the previous run."""
+        return self.rows < self._resumed_rows
+
+    def resume(self, keys: Sequence[str]) -> int:
+        """Return how many of the leading keys are already written; the caller continues after them."""
+        if not self._resumed_rows or self.rows:
+            return self.rows
+        digest = ""
+        for key in keys[:self._resumed_rows]:
+            digest = _chain_digest(digest, key)
+        if len(keys) >= self._resumed_rows and digest == self._resumed_digest:
+            self.rows, self._digest = self._resumed_rows, digest
+        else:
+            self._restart([])
+        return self.rows
+
+    def write(self, row: str, key: str):
+        """Append a row; key identifies it (e.g. the slice path) when a later run resumes."""
+        self._digest = _chain_digest(self._digest, key)
+        self.rows += 1
+        if self.rows <= self._resumed_rows:
+            self._replay.append(row)
+            if self.rows == self._resumed_rows:
+                if self._digest != self._resumed_digest:
+                    self._restart(self._replay)
+                self._replay = []
+            return
+        # Write each row manually to avoid any automatic quoting
+        self._file.write(f"{row}\n".encode("utf-8"))
+        if (self.rows - self._checkpointed_rows >= self.checkpoint_rows
+                or time.monotonic() - self._checkpointed_at >= self.checkpoint_seconds):
+            self.checkpoint()
+
+    def _restart(self, rows: List[str]):
+        """Drop the rows kept from the previous run and write the given ones after the header."""
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(f"{self.header}\n".encode("utf-8"))
+        for row in rows:
+            self._file.write(f"{row}\n".encode("utf-8"))
+        self._resumed_rows = 0
+
+    def checkpoint(self):
+        """Make the rows written so far durable and record them for a later resume."""
+        if self.replaying:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        state = {"header": self.header, "rows": self.rows, "offset": self._file.tell(), "digest": self._digest}
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+        self._checkpointed_rows = self.rows
+        self._checkpointed_at = time.monotonic()
+
+    def close(self):
+        """Finish the file and move it into place as transcriptions.csv."""
+        if self.replaying:
+            # Fewer rows than the previous run had: what is on disk is not this run's output
+            self._restart(self._replay)
+            self._replay = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def abort(self):
+        """Stop writing and keep the partial file and checkpoint for the next run to resume from."""
+        if not self.replaying:
+            self.checkpoint()
+        self._file.close()
+
+    def __enter__(self) -> "TranscriptionWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def save_transcriptions_to_csv(transcriptions: Iterable[str], output_path: str, header: str):
     """Save the list of transcriptions to a CSV file."""
-    with open(output_csv_path, mode="w", newline="", encoding="utf-8") as file:
-        # Write the header row manually
-        file.write(f"{header}\n")
+    with TranscriptionWriter(output_path, header, resume=False) as writer:
         for row in transcriptions:
-            # Write each row manually to avoid any automatic quoting
-            file.write(row + "\n")
\ No newline at end of file
+            writer.write(row, row)
@@ -0,0 +1,145 @@
+"""
+Find the pauses of an audio file with the Silero voice activity detector.
+
+The "vad" planner (see planner.plan_cuts) cuts at these pauses instead of at
+stretches that are quiet relative to the file's loudness, which holds up
+better under background noise, music beds and level changes. The model runs
+on the CPU over the whole file at 16 kHz. It is recurrent, so one 32 ms
+window follows another; to keep the per-call overhead low the file is split
+into LANES contiguous stretches that are fed as one batch, each stretch
+primed on the half second of audio before it.
+
+torch and silero-vad are only imported once a file is actually run through
+the model, so the other planners do not pay for them.
+"""
+import threading
+
+import numpy as np
+
+from decoder import iter_blocks, resample_blocks
+from metrics import timed, timed_iter
+from silence import BLOCK_FRAMES
+
+VAD_SAMPLE_RATE = 16000
+WINDOW = 512  # samples per model call and lane, 32 ms at 16 kHz
+LANES = 32  # stretches of the file run through the model as one batch
+WARMUP_WINDOWS = 16  # audio before each stretch that only primes the model state
+SPEECH_THRESHOLD = 0.5  # probability at which a pause ends
+PAUSE_THRESHOLD = 0.35  # probability under which speech ends
+MIN_PAUSE = 250  # shortest pause to cut at, in milliseconds
+USE_ONNX = True  # onnxruntime model, else the TorchScript one
+
+_models = threading.local()
+
+
+def load_model(onnx=USE_ONNX):
+    """
+    Return the Silero VAD model of this thread, loading it on first use.
+
+    The model keeps state between calls, so threads (e.g. concurrent jobs)
+    each get their own.
+    """
+    models = _models.__dict__
+    if onnx not in models:
+        from silero_vad import load_silero_vad
+
+        with timed("model_load"):
+            models[onnx] = load_silero_vad(onnx=onnx)
+    return models[onnx]
+
+
+def speech_probabilities(audio, model, lanes=LANES):
+    """
+    Run the model over mono 16 kHz audio.
+
+    Parameters:
+        audio (numpy.ndarray): float32 samples in [-1, 1].
+        model: Silero VAD model, see load_model.
+        lanes (int): Stretches of the audio run as one batch.
+
+    Returns:
+        numpy.ndarray: Speech probability of each WINDOW of the audio.
+    """
+    import torch
+
+    windows = -(-len(audio) // WINDOW)
+    if not windows:
+        return np.zeros(0, np.float32)
+    lanes = max(1, min(lanes, windows))
+    per_lane = -(-windows // lanes)
+    warmup = WARMUP_WINDOWS if lanes > 1 else 0
+
+    # Lane k covers windows [k * per_lane, (k + 1) * per_lane) after warmup
+    # windows of the audio before them (of zeros for the first lane).
+    padded = np.zeros((warmup + lanes * per_lane) * WINDOW, np.float32)
+    padded[warmup * WINDOW:warmup * WINDOW + len(audio)] = audio
+    itemsize = padded.itemsize
+    rows = np.lib.stride_tricks.as_strided(padded, (lanes, (warmup + per_lane) * WINDOW),
+                                           (per_lane * WINDOW * itemsize, itemsize), writeable=False)
+
+    probabilities = np.empty((warmup + per_lane, lanes), np.float32)
+    model.reset_states()
+    with torch.no_grad():
+        for step in range(warmup + per_lane):
+            chunk = torch.from_numpy(rows[:, step * WINDOW:(step + 1) * WINDOW].copy())
+            probabilities[step] = model(chunk, VAD_SAMPLE_RATE).numpy()[:, 0]
+    model.reset_states()
+    return probabilities[warmup:].T.reshape(-1)[:windows]
+
+
+def find_pauses(probabilities, min_pause=MIN_PAUSE, length=None):
+    """
+    Turn window probabilities into pauses.
+
+    Speech starts where the probability reaches SPEECH_THRESHOLD and lasts
+    until it drops under PAUSE_THRESHOLD, so a pause is not split by a
+    window that only flickers above the lower threshold.
+
+    Parameters:
+        probabilities (numpy.ndarray): Output of speech_probabilities.
+        min_pause (int): Shortest pause to keep, in milliseconds.
+        length (int): Length of the file in milliseconds, to clip the last pause to.
+
+    Returns:
+        list: (start, end) pauses in milliseconds, in file order.
+    """
+    window_ms = WINDOW * 1000 / VAD_SAMPLE_RATE
+    decided = (probabilities >= SPEECH_THRESHOLD) | (probabilities < PAUSE_THRESHOLD)
+    # Each window takes the state of the last window that decided it; the file starts in a pause
+    last = np.maximum.accumulate(np.where(decided, np.arange(len(probabilities)), -1))
+    speech = np.where(last >= 0, probabilities[np.maximum(last, 0)] >= SPEECH_THRESHOLD, False)
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], speech.astype(np.int8), [1]))))
+    if length is None:
+        length = len(probabilities) * window_ms
+    pauses = []
+    for first, stop in zip(edges[::2], edges[1::2]):
+        start, end = int(round(first * window_ms)), int(min(round(stop * window_ms), length))
+        if end - start >= min_pause:
+            pauses.append((start, end))
+    return pauses
+
+
+def detect_pauses(file_path, envelope, samples=None, onnx=USE_ONNX):
+    """
+    Find the pauses of one audio file for the "vad" planner.
+
+    Parameters:
+        file_path (str): Path to the .wav or .mp3 file.
+        envelope (SilenceEnvelope): Envelope of the file, for its stream parameters.
+        samples (numpy.ndarray): The file's samples as slicer.file_envelope
+            returns them, or None to decode the file block by block.
+        onnx (bool): Run the ONNX model instead of the TorchScript one.
+
+    Returns:
+        list: (start, end) pauses in milliseconds, in file order.
+    """
+    model = load_model(onnx)
+    if samples is None:
+        blocks = timed_iter("decode", iter_blocks(file_path), envelope.frame_rate)
+    else:
+        blocks = (samples[i:i + BLOCK_FRAMES] for i in range(0, len(samples), BLOCK_FRAMES))
+    with timed("vad", len(envelope) / 1000) as span:
+        audio = resample_blocks(blocks, envelope.frame_rate, envelope.max_possible_amplitude, VAD_SAMPLE_RATE)
+        span.exclude = blocks.seconds if samples is None else 0.0
+        return find_pauses(speech_probabilities(audio, model), length=len(envelope))